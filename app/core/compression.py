@@ -0,0 +1,8 @@
+from starlette.middleware.gzip import GZipMiddleware
+
+from app.core.config import RESPONSE_GZIP_LEVEL, RESPONSE_GZIP_MIN_BYTES
+
+def add_compression(app):
+    # Responses are gzip-compressed (streamed) for clients sending "Accept-Encoding: gzip".
+    if RESPONSE_GZIP_MIN_BYTES > 0:
+        app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_GZIP_MIN_BYTES, compresslevel=RESPONSE_GZIP_LEVEL)
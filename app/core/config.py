@@ -1 +1,71 @@
+import os
+
 ALLOWED_RANKS = ["root", "superkingdom", "kingdom", "subkingdom", "superphylum", "phylum", "subphylum", "superclass", "class", "subclass", "superorder", "order", "suborder", "superfamily", "family", "subfamily", "supergenus", "genus", "subgenus", "superspecies", "species"]
+
+# Uploads are read in chunks of this many bytes instead of all at once.
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Upper bound (estimated bytes) for the process-wide taxID -> lineage cache; 0 disables it.
+LINEAGE_CACHE_MAX_BYTES = int(os.environ.get("TAXSUN_LINEAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Responses of at least this many bytes are gzip-compressed for clients that accept it; 0 disables it.
+# Uploads may be gzip- or zstd-compressed (detected from their first bytes) regardless of this setting.
+RESPONSE_GZIP_MIN_BYTES = int(os.environ.get("TAXSUN_RESPONSE_GZIP_MIN_BYTES", 64 * 1024))
+RESPONSE_GZIP_LEVEL = int(os.environ.get("TAXSUN_RESPONSE_GZIP_LEVEL", 6))
+
+# Tree construction engine for /load_tsv_data: "trie" (single pass, app/utils/tree.py) or
+# "legacy" (filter -> dedupe -> propagate stages). Both produce the same response.
+TREE_BUILDER = os.environ.get("TAXSUN_TREE_BUILDER", "trie")
+
+# Keep only this many hits (the best by e-value) per taxon in /load_tsv_data responses; 0 keeps all of them.
+# Overridable per request with ?topHits=; the full lists stay available through mode=session.
+HIT_TOP_K = int(os.environ.get("TAXSUN_HIT_TOP_K", 0))
+
+# On-disk cache of rendered /load_tsv_data responses, keyed by upload hash; 0 bytes disables it.
+RESULT_CACHE_DIR = os.environ.get("TAXSUN_RESULT_CACHE_DIR", "data/cache/results")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("TAXSUN_RESULT_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Dataset jobs run in a pool of this many processes per server worker (0 runs them in a thread instead).
+DATASET_WORKERS = int(os.environ.get("TAXSUN_DATASET_WORKERS", min(4, os.cpu_count() or 1)))
+# Jobs allowed to wait for a free pool process before new uploads are rejected with 503.
+DATASET_QUEUE_DEPTH = int(os.environ.get("TAXSUN_DATASET_QUEUE_DEPTH", 8))
+# Split the per-line parsing of large TSV uploads across this many processes (1 parses in the job's own process).
+PARSE_SHARDS = int(os.environ.get("TAXSUN_PARSE_SHARDS", 1))
+# Smallest shard worth its inter-process overhead; smaller uploads use fewer shards.
+PARSE_SHARD_MIN_BYTES = int(os.environ.get("TAXSUN_PARSE_SHARD_MIN_BYTES", 16 * 1024 * 1024))
+# Most TSV uploads /compare_tsv_data accepts in one request.
+COMPARE_MAX_SAMPLES = int(os.environ.get("TAXSUN_COMPARE_MAX_SAMPLES", 50))
+# Uploads are copied here (as named files) so pool processes can read them; empty means the system temp dir.
+UPLOAD_SPOOL_DIR = os.environ.get("TAXSUN_UPLOAD_SPOOL_DIR") or None
+
+# Background jobs (/load_tsv_data?mode=async): state and results live here, shared by all server workers.
+JOB_DIR = os.environ.get("TAXSUN_JOB_DIR", "data/jobs")
+# Finished jobs (and their results) are deleted this many seconds after their last update.
+JOB_TTL_SECONDS = int(os.environ.get("TAXSUN_JOB_TTL_SECONDS", 3600))
+
+# Uploaded protein FASTA files are kept here as indexed sequence stores, so single sequences can be
+# fetched later (POST /faa_data/{id}/sequences); stores unused for FASTA_STORE_TTL_SECONDS are deleted.
+FASTA_STORE_DIR = os.environ.get("TAXSUN_FASTA_STORE_DIR", "data/fasta")
+FASTA_STORE_TTL_SECONDS = int(os.environ.get("TAXSUN_FASTA_STORE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Processed datasets of /load_tsv_data?mode=session live here, so the tree and the hits of single taxa can be
+# fetched on demand (/datasets/{id}/...); datasets unused for SESSION_TTL_SECONDS are deleted.
+SESSION_DIR = os.environ.get("TAXSUN_SESSION_DIR", "data/sessions")
+SESSION_TTL_SECONDS = int(os.environ.get("TAXSUN_SESSION_TTL_SECONDS", 24 * 3600))
+
+# Load the taxonomy (and start the dataset pool) in the background as soon as a server worker starts;
+# /ready answers 503 until it is loaded, and a failed load is retried with backoff. Disabled, the taxonomy is
+# loaded by the first request needing it or by the first /ready probe.
+TAXONOMY_WARMUP = os.environ.get("TAXSUN_TAXONOMY_WARMUP", "1").lower() in ("1", "true", "yes")
+
+# Where the NCBI taxdump comes from: a URL, or for offline setups a local taxdump.tar.gz or a mirror
+# directory containing one. Its MD5 is read from "<archive>.md5" (computed from a local archive without one).
+TAXDUMP_SOURCE = os.environ.get("TAXSUN_TAXDUMP_SOURCE", "https://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdump.tar.gz")
+
+# Check NCBI for a new taxdump release this often (0 disables it). A new release is downloaded and compiled
+# in the background, then every worker switches to it within TAXONOMY_RELOAD_CHECK_SECONDS, without restarts.
+TAXONOMY_REFRESH_SECONDS = int(os.environ.get("TAXSUN_TAXONOMY_REFRESH_SECONDS", 24 * 3600))
+TAXONOMY_RELOAD_CHECK_SECONDS = int(os.environ.get("TAXSUN_TAXONOMY_RELOAD_CHECK_SECONDS", 30))
+
+# Add a Server-Timing header (per-stage durations) to dataset responses, e.g. for the browser's devtools.
+SERVER_TIMING = os.environ.get("TAXSUN_SERVER_TIMING", "0").lower() in ("1", "true", "yes")
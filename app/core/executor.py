@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import DATASET_QUEUE_DEPTH, DATASET_WORKERS, PARSE_SHARDS
+from app.core.taxdb import get_taxdb
+
+
+def _init_worker() -> None:
+    # Map the taxonomy index once per pool process instead of once per job.
+    get_taxdb()
+
+
+class DatasetExecutor:
+    """
+    Runs CPU-bound dataset jobs off the event loop, in a process pool.
+
+    At most `workers` jobs run at once; up to `queue_depth` more may wait for a free process.
+    Beyond that, `run` fails fast with 503 so clients can retry later instead of piling up
+    multi-minute jobs on a saturated worker.
+    """
+
+    def __init__(self, workers: int, queue_depth: int) -> None:
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.active = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # The pool may be created by the warm-up thread while requests come in.
+        self._pool_lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.queue_depth
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._pool
+
+    def warm_up(self) -> None:
+        """Start the pool processes now (each maps the taxonomy in its initializer) instead of on the first jobs."""
+        if self.workers <= 0:
+            return
+        pool = self._get_pool()
+        # A pool process is spawned per submission while none is idle, so submit one no-op per worker at once.
+        try:
+            for future in [pool.submit(_init_worker) for _ in range(self.workers)]:
+                future.result()
+        except BrokenProcessPool:
+            # Leave a fresh pool for the first job rather than one that can only fail.
+            self._discard_pool(pool)
+            raise
+
+    def check_capacity(self) -> None:
+        """Raise 503 if no more jobs can be accepted right now."""
+        if self.active >= self.capacity:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy processing other datasets, please retry shortly.",
+                headers={"Retry-After": "30"},
+            )
+
+    def reserve(self) -> None:
+        """
+        Take a slot now for a job that will `run_reserved` later (raises 503 if none is free).
+
+        Background jobs reserve their slot when they are accepted, so they wait for a pool
+        process instead of failing as busy; `release` must follow once the job is over.
+        """
+        self.check_capacity()
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn(*args)` in the pool; `fn` and its arguments must be picklable."""
+        self.reserve()
+        try:
+            return await self.run_reserved(fn, *args)
+        finally:
+            self.release()
+
+    async def run_reserved(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """`run` for a job whose slot was taken with `reserve`: never rejected, it waits for a process."""
+        if self.workers <= 0:
+            return await run_in_threadpool(fn, *args)
+
+        pool = self._get_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM-killed); start a fresh pool for the next job.
+            self._discard_pool(pool)
+            raise
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Drop a broken pool, unless it was already replaced; the next job creates a new one."""
+        with self._pool_lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+dataset_executor = DatasetExecutor(DATASET_WORKERS, DATASET_QUEUE_DEPTH)
+
+
+def run_sharded(fn: Callable[..., Any], args: Sequence[Tuple[Any, ...]]) -> List[Any]:
+    """
+    Run `fn(*a)` for every `a` in `args` on up to PARSE_SHARDS processes and return the results in order.
+
+    Blocking; meant to be called from inside a dataset job, which then waits for its shards.
+    The processes live for this call only: a pool kept inside a dataset pool process would
+    outlive it and block its exit. Sharding is only used for uploads large enough for the
+    start-up cost not to matter.
+    """
+    workers = max(1, min(PARSE_SHARDS, len(args)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(fn, *a) for a in args]
+        return [future.result() for future in futures]
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import resource
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds of the histogram buckets (+Inf is implicit).
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = tuple(float(1 << shift) for shift in range(10, 36, 2))  # 1 KiB .. 16 GiB
+COUNT_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> per-bucket counts (not cumulative), sum, count
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+            counts, totals = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), list(totals))) for key, (counts, totals) in self._series.items())
+
+        samples = []
+        for key, (counts, (total, count)) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                samples.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text format.
+
+    Each server worker process keeps its own registry; pool processes do not record anything
+    themselves but send their measurements back with their results (see `StageTimer`).
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets, labelnames))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "taxsun_stage_seconds", "Time spent per dataset processing stage.", SECONDS_BUCKETS, ("pipeline", "stage")
+)
+request_seconds = registry.histogram(
+    "taxsun_dataset_seconds", "End-to-end dataset processing time, upload included.", SECONDS_BUCKETS, ("pipeline",)
+)
+input_bytes = registry.histogram("taxsun_input_bytes", "Size of uploaded datasets.", BYTES_BUCKETS, ("pipeline",))
+input_lines = registry.histogram("taxsun_input_lines", "Data lines per TSV upload.", COUNT_BUCKETS, ("pipeline",))
+input_taxa = registry.histogram("taxsun_input_taxa", "Distinct taxIDs per TSV upload.", COUNT_BUCKETS, ("pipeline",))
+input_sequences = registry.histogram("taxsun_input_sequences", "Sequences per FASTA upload.", COUNT_BUCKETS, ("pipeline",))
+peak_rss_bytes = registry.histogram(
+    "taxsun_worker_peak_rss_bytes",
+    "Peak resident memory of the process that ran a dataset job, sampled when the job ends.",
+    BYTES_BUCKETS,
+    ("pipeline",),
+)
+result_cache_requests = registry.counter(
+    "taxsun_result_cache_requests_total", "Result cache lookups by outcome.", ("result",)
+)
+taxonomy_load_seconds = registry.histogram(
+    "taxsun_taxonomy_load_seconds", "Time to load (or switch to) the taxonomy index.", SECONDS_BUCKETS, ("kind",)
+)
+# Updated when /metrics is scraped.
+lineage_cache_stats = registry.gauge("taxsun_lineage_cache", "Lineage cache statistics.", ("stat",))
+dataset_jobs_active = registry.gauge("taxsun_dataset_jobs_active", "Dataset jobs running or waiting for a pool process.")
+
+
+def process_peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class StageTimer:
+    """
+    Progress callback that times the pipeline stages it is told about.
+
+    A stage lasts from the first progress call naming it until a call names another stage,
+    so instrumentation costs nothing beyond the (already throttled) progress calls. Counters
+    passed along (linesParsed, taxaResolved, ...) are kept, and every call is forwarded to
+    `progress`, if given.
+
+    Created where the pipeline runs; `report()` is a plain dict that can be sent back from a
+    pool process with the result and recorded in the server's registry with `record_report`.
+    """
+
+    def __init__(self, progress: Optional[Callable[..., None]] = None) -> None:
+        self.progress = progress
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, Any] = {}
+        self._stage: Optional[str] = None
+        self._started = self._stage_started = time.perf_counter()
+
+    def __call__(self, stage: str, **counters: Any) -> None:
+        if stage != self._stage:
+            self._switch(stage)
+        self.counters.update(counters)
+        if self.progress is not None:
+            self.progress(stage, **counters)
+
+    def _switch(self, stage: Optional[str]) -> None:
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.stages[self._stage] = self.stages.get(self._stage, 0.0) + now - self._stage_started
+        self._stage, self._stage_started = stage, now
+
+    def report(self) -> Dict[str, Any]:
+        self._switch(None)
+        return {
+            "stages": dict(self.stages),
+            "counters": dict(self.counters),
+            "seconds": time.perf_counter() - self._started,
+            "peakRssBytes": process_peak_rss_bytes(),
+        }
+
+
+def record_report(pipeline: str, report: Dict[str, Any]) -> None:
+    for stage, seconds in report["stages"].items():
+        stage_seconds.observe(seconds, pipeline=pipeline, stage=stage.replace(" ", "_"))
+    peak_rss_bytes.observe(report["peakRssBytes"], pipeline=pipeline)
+
+    counters = report["counters"]
+    if "linesParsed" in counters:
+        input_lines.observe(counters["linesParsed"], pipeline=pipeline)
+    if "taxaResolved" in counters:
+        input_taxa.observe(counters["taxaResolved"], pipeline=pipeline)
+    if "sequences" in counters:
+        input_sequences.observe(counters["sequences"], pipeline=pipeline)
+
+
+def server_timing(stages: Dict[str, float]) -> str:
+    """Server-Timing header value (durations in milliseconds) for stage -> seconds."""
+    return ", ".join(f"{stage.replace(' ', '_')};dur={seconds * 1000:.1f}" for stage, seconds in stages.items())
@@ -1,20 +1,48 @@
 import os
 import time
+import shutil
+import hashlib
 import tarfile
+import threading
 import urllib.request
+from collections import OrderedDict
 from pathlib import Path
-from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple
 
-import taxopy
+from app.core.config import (
+    LINEAGE_CACHE_MAX_BYTES,
+    TAXDUMP_SOURCE,
+    TAXONOMY_REFRESH_SECONDS,
+    TAXONOMY_RELOAD_CHECK_SECONDS,
+    TAXONOMY_WARMUP,
+)
+from app.core.metrics import process_peak_rss_bytes, taxonomy_load_seconds
+from app.core.taxindex import (
+    INDEX_FORMAT_VERSION,
+    TaxdumpTables,
+    TaxonomyIndex,
+    build_taxonomy_index,
+    index_is_current,
+    read_index_meta,
+    swap_index_dir,
+)
 
 DATA_DIR = Path("data/taxonomy")
 NODES = DATA_DIR / "nodes.dmp"
 NAMES = DATA_DIR / "names.dmp"
 MERGED = DATA_DIR / "merged.dmp"
 
-TAXDUMP_URL = "https://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdump.tar.gz"
+# Left by older versions (and kept by hand-made installs); only read to learn the installed release's MD5.
 TAXDUMP_ARCHIVE = DATA_DIR / "taxdump.tar.gz"
+TAXDUMP_MD5 = DATA_DIR / "taxdump.tar.gz.md5"
 LOCKFILE = DATA_DIR / ".taxdump.lock"
+INDEX_DIR = DATA_DIR / "index"
+
+# Background refreshes prepare the next release here, next to (not in place of) the active one.
+STAGING_DIR = DATA_DIR / "staging"
+REFRESH_LOCKFILE = DATA_DIR / ".refresh.lock"
+# A refresh lock older than this was left behind by a crashed process.
+REFRESH_LOCK_STALE_SECONDS = 6 * 3600
 
 
 def _missing_taxdump_files() -> list[str]:
@@ -51,83 +79,478 @@ def _release_lock() -> None:
         pass
 
 
-def _download_file(url: str, dest: Path) -> None:
-    dest.parent.mkdir(parents=True, exist_ok=True)
-    # Download atomically: write to temp then rename
-    tmp = dest.with_suffix(dest.suffix + ".tmp")
-    with urllib.request.urlopen(url) as r, open(tmp, "wb") as f:
-        f.write(r.read())
-    tmp.replace(dest)
+def _taxdump_location() -> str:
+    """URL or path of the taxdump archive; TAXDUMP_SOURCE may also name a mirror directory."""
+    if "://" not in TAXDUMP_SOURCE and Path(TAXDUMP_SOURCE).is_dir():
+        return str(Path(TAXDUMP_SOURCE) / TAXDUMP_ARCHIVE.name)
+    return TAXDUMP_SOURCE
+
+
+def _open_location(location: str) -> BinaryIO:
+    return urllib.request.urlopen(location) if "://" in location else open(location, "rb")
+
 
+class _HashingReader:
+    """Binary stream wrapper that computes the MD5 of everything read through it."""
 
-def _extract_needed_files(archive_path: Path, target_dir: Path) -> None:
-    needed = {"nodes.dmp", "names.dmp", "merged.dmp"}
-    with tarfile.open(archive_path, "r:gz") as tar:
-        members = [m for m in tar.getmembers() if Path(m.name).name in needed]
-        tar.extractall(path=target_dir, members=members)
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        self.md5 = hashlib.md5()
 
-    # Some tarballs include paths; normalize to flat files in target_dir
-    for name in needed:
-        candidates = list(target_dir.rglob(name))
-        if not candidates:
-            continue
-        # Move the first occurrence to the expected path
-        src = candidates[0]
-        dst = target_dir / name
-        if src.resolve() != dst.resolve():
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            src.replace(dst)
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self.md5.update(data)
+        return data
 
 
-def ensure_taxdump_present() -> None:
+def _stream_taxdump(target_dir: Path, tables: Optional[TaxdumpTables] = None) -> str:
+    """
+    Extract nodes.dmp, names.dmp and merged.dmp from the taxdump archive into `target_dir`.
+
+    The archive is read once as a stream, straight from TAXDUMP_SOURCE: it is neither saved
+    nor held in memory, and only the three needed members are written (flat, whatever their
+    path inside the archive). With `tables`, their rows are also fed into it as they are
+    decompressed, ready for `build_taxonomy_index`.
+
+    Returns the MD5 of the archive.
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    needed = {NODES.name, NAMES.name, MERGED.name}
+    with _open_location(_taxdump_location()) as raw:
+        source = _HashingReader(raw)
+        with tarfile.open(fileobj=source, mode="r|gz") as tar:
+            for member in tar:
+                name = Path(member.name).name
+                if name not in needed or not member.isfile():
+                    continue
+                add = tables.row_handler(name) if tables is not None else None
+                tmp = target_dir / f".{name}.tmp"
+                with tar.extractfile(member) as src, open(tmp, "wb") as dst:
+                    if add is None:
+                        shutil.copyfileobj(src, dst, 1 << 20)
+                    else:
+                        for line in src:
+                            dst.write(line)
+                            add(line.decode("utf-8").split("\t"))
+                tmp.replace(target_dir / name)
+                needed.discard(name)
+                if not needed:
+                    break
+        # The rest of the archive only matters for its checksum, so it is hashed but not decompressed.
+        while source.read(1 << 20):
+            pass
+
+    if needed:
+        raise RuntimeError(f"The taxdump archive lacks {sorted(needed)}")
+    return source.md5.hexdigest()
+
+
+def ensure_taxdump_present() -> Optional[TaxdumpTables]:
     """
     Ensure required NCBI taxonomy dump files exist in data/taxonomy.
-    Downloads + extracts them if missing.
+    Streams them out of the taxdump archive if missing.
+
+    Returns the tables parsed during extraction if the files were just extracted, else None.
     """
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
     missing = _missing_taxdump_files()
     if not missing:
-        return
+        return None
 
     _acquire_lock()
     try:
         # Re-check after acquiring lock (another process may have finished)
         missing = _missing_taxdump_files()
         if not missing:
-            return
+            return None
 
-        print(f"[taxSun] Missing taxonomy files: {missing}. Downloading taxdump...")
+        print(f"[taxSun] Missing taxonomy files: {missing}. Fetching taxdump from {_taxdump_location()}...")
 
-        _download_file(TAXDUMP_URL, TAXDUMP_ARCHIVE)
-        _extract_needed_files(TAXDUMP_ARCHIVE, DATA_DIR)
+        tables = TaxdumpTables()
+        TAXDUMP_MD5.write_text(_stream_taxdump(DATA_DIR, tables))
 
-        # Final check
-        missing = _missing_taxdump_files()
-        if missing:
-            raise RuntimeError(
-                f"Download/extract finished but files are still missing: {missing}"
-            )
+        print("[taxSun] Taxonomy files ready.")
+        return tables
+    finally:
+        _release_lock()
 
-        # optional: keep archive to avoid re-download; or delete it:
-        # TAXDUMP_ARCHIVE.unlink(missing_ok=True)
 
-        print("[taxSun] Taxonomy files ready.")
+def ensure_taxonomy_index() -> None:
+    """
+    Ensure a compiled taxonomy index matching the current taxdump files exists.
+    Compiles it (once, under the download lock) if it is missing or stale.
+    """
+    tables = ensure_taxdump_present()
+
+    if index_is_current(INDEX_DIR, NODES, NAMES, MERGED):
+        return
+
+    _acquire_lock()
+    try:
+        if index_is_current(INDEX_DIR, NODES, NAMES, MERGED):
+            return
+
+        print(f"[taxSun] Compiling taxonomy index into {INDEX_DIR}...")
+        start = time.time()
+        build_taxonomy_index(NODES, NAMES, MERGED, INDEX_DIR, tables)
+        print(f"[taxSun] Taxonomy index ready ({time.time() - start:.1f}s).")
     finally:
         _release_lock()
 
 
-@lru_cache(maxsize=1)
-def get_taxdb() -> taxopy.TaxDb:
+def _fetch_remote_md5() -> str:
+    location = _taxdump_location()
+    if "://" not in location and not Path(location + ".md5").exists():
+        return _file_md5(Path(location))
+    with _open_location(location + ".md5") as r:
+        return r.read().decode("utf-8").split()[0]
+
+
+def _file_md5(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _acquire_refresh_lock() -> bool:
+    """Non-blocking: only one process refreshes at a time, the others skip their turn."""
+    try:
+        if time.time() - REFRESH_LOCKFILE.stat().st_mtime > REFRESH_LOCK_STALE_SECONDS:
+            REFRESH_LOCKFILE.unlink(missing_ok=True)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(str(REFRESH_LOCKFILE), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def refresh_taxonomy() -> bool:
+    """
+    Install the latest NCBI taxdump release if it differs from the one in use.
+
+    The release is downloaded, verified and compiled in STAGING_DIR while the current index keeps
+    serving requests; only the final swap of the dump files and the index directory happens under
+    the download lock. Running processes pick the new index up through `get_taxdb`.
+
+    Returns True if a new release was installed.
+    """
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    if not _acquire_refresh_lock():
+        return False
+    try:
+        remote_md5 = _fetch_remote_md5()
+        if TAXDUMP_MD5.exists():
+            local_md5 = TAXDUMP_MD5.read_text().strip()
+        else:
+            # Installed by hand or by an older version, which record no checksum.
+            local_md5 = _file_md5(TAXDUMP_ARCHIVE) if TAXDUMP_ARCHIVE.exists() else None
+        if remote_md5 == local_md5:
+            return False
+
+        print("[taxSun] New taxdump release available, preparing it in the background...")
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        STAGING_DIR.mkdir(parents=True)
+
+        tables = TaxdumpTables()
+        if _stream_taxdump(STAGING_DIR, tables) != remote_md5:
+            raise RuntimeError("Downloaded taxdump does not match its published MD5 checksum")
+
+        staged = {p.name: STAGING_DIR / p.name for p in (NODES, NAMES, MERGED)}
+        staged_index = STAGING_DIR / INDEX_DIR.name
+        build_taxonomy_index(staged[NODES.name], staged[NAMES.name], staged[MERGED.name], staged_index, tables)
+
+        _acquire_lock()
+        try:
+            # Renames keep the files' mtimes, so the staged index stays current for the moved dumps.
+            for path in (NODES, NAMES, MERGED):
+                staged[path.name].replace(path)
+            # The release is now identified by TAXDUMP_MD5; an archive from an older install would be stale.
+            TAXDUMP_ARCHIVE.unlink(missing_ok=True)
+            swap_index_dir(staged_index, INDEX_DIR)
+            TAXDUMP_MD5.write_text(remote_md5)
+        finally:
+            _release_lock()
+
+        print(f"[taxSun] Taxonomy updated to index version {read_index_meta(INDEX_DIR)['version']}.")
+        return True
+    finally:
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        REFRESH_LOCKFILE.unlink(missing_ok=True)
+
+
+class TaxonomyRefresher:
+    """Daemon thread that calls `refresh_taxonomy` every `interval` seconds (first run after one interval)."""
+
+    def __init__(self, interval: int) -> None:
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="taxonomy-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                refresh_taxonomy()
+            except Exception as exc:
+                # Keep serving the current taxonomy; try again next interval.
+                print(f"[taxSun] Taxonomy refresh failed: {type(exc).__name__}: {exc}")
+
+
+taxonomy_refresher = TaxonomyRefresher(TAXONOMY_REFRESH_SECONDS)
+
+
+_taxdb: Optional[TaxonomyIndex] = None
+_taxdb_checked_at = 0.0
+_taxdb_lock = threading.Lock()
+
+
+def _reload_if_changed(current: TaxonomyIndex) -> TaxonomyIndex:
+    meta = read_index_meta(INDEX_DIR)
+    if meta is None or meta.get("format") != INDEX_FORMAT_VERSION or meta.get("version") == current.version:
+        return current
+    start = time.perf_counter()
+    try:
+        taxdb = TaxonomyIndex(INDEX_DIR)
+    except (OSError, RuntimeError, ValueError):
+        # Caught mid-swap; the next check picks it up.
+        return current
+    taxonomy_load_seconds.observe(time.perf_counter() - start, kind="reload")
+    print(f"[taxSun] Switched taxonomy index {current.version} -> {taxdb.version}")
+    return taxdb
+
+
+def get_taxdb() -> TaxonomyIndex:
     """
     Lazy, one-time initialization per process.
-    Safe for requests: the DB is created once and reused.
+    Safe for requests: the index is memory-mapped read-only and shared by all workers.
+
+    Every TAXONOMY_RELOAD_CHECK_SECONDS the index version on disk is compared with the loaded one,
+    and a newer index (see `refresh_taxonomy`) replaces it. Callers holding the previous index keep
+    a valid view of it until they drop it, so in-flight requests finish on the old version.
+    """
+    global _taxdb, _taxdb_checked_at
+
+    taxdb = _taxdb
+    if taxdb is not None and time.monotonic() - _taxdb_checked_at < TAXONOMY_RELOAD_CHECK_SECONDS:
+        return taxdb
+
+    with _taxdb_lock:
+        if _taxdb is None:
+            start = time.perf_counter()
+            ensure_taxonomy_index()
+            print(f"[taxSun] Using compiled taxonomy index from {INDEX_DIR}")
+            _taxdb = TaxonomyIndex(INDEX_DIR)
+            taxonomy_load_seconds.observe(time.perf_counter() - start, kind="initial")
+        elif time.monotonic() - _taxdb_checked_at >= TAXONOMY_RELOAD_CHECK_SECONDS:
+            _taxdb = _reload_if_changed(_taxdb)
+        _taxdb_checked_at = time.monotonic()
+        return _taxdb
+
+
+def taxonomy_version() -> Optional[str]:
+    """Version of the taxonomy index this process is using, or None before it is first loaded."""
+    return get_taxdb().version if _taxdb is not None else None
+
+
+def taxonomy_ready() -> bool:
+    """Whether this process has loaded the taxonomy, i.e. requests will not wait for it."""
+    return _taxdb is not None
+
+
+def _index_bytes() -> int:
+    return sum(p.stat().st_size for p in INDEX_DIR.iterdir() if p.is_file())
+
+
+class TaxonomyWarmup:
+    """
+    Loads the taxonomy in a daemon thread when a server worker starts, so the first request
+    does not pay for it (or for the initial download and compilation) and time out.
+
+    A failed load is retried with exponential backoff, from `retry_seconds` up to
+    `max_retry_seconds` apart; `error` holds the reason of the last failure. With warm-up
+    disabled nothing is loaded at startup, and `ensure_started` (called by /ready) starts the
+    load instead, so a load balancer gating on /ready does not wait for a request that never comes.
+    """
+
+    retry_seconds = 5.0
+    max_retry_seconds = 300.0
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.error: Optional[str] = None
+        self._then: Optional[Callable[[], None]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loading(self) -> bool:
+        """Whether the taxonomy is being loaded right now; `get_taxdb` would block until it is done."""
+        return self._running() and not taxonomy_ready()
+
+    def _running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, then: Optional[Callable[[], None]] = None) -> None:
+        """Start loading if enabled; `then` runs in the same thread once the taxonomy is loaded."""
+        self._then = then
+        if self.enabled:
+            with self._lock:
+                if self._thread is None:
+                    self._spawn()
+
+    def ensure_started(self) -> None:
+        """Start loading unless the taxonomy is loaded or a load is already running."""
+        with self._lock:
+            if not taxonomy_ready() and not self._running():
+                self._spawn()
+
+    def _spawn(self) -> None:
+        self._thread = threading.Thread(target=self._run, args=(self._then,), name="taxonomy-warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self, then: Optional[Callable[[], None]]) -> None:
+        start = time.perf_counter()
+        delay = self.retry_seconds
+        while True:
+            try:
+                taxdb = get_taxdb()
+                break
+            except Exception as exc:
+                self.error = f"{type(exc).__name__}: {exc}"
+                print(f"[taxSun] Taxonomy warm-up failed: {self.error}; retrying in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_seconds)
+        self.error = None
+        print(
+            f"[taxSun] Taxonomy index {taxdb.version} ready after {time.perf_counter() - start:.1f}s "
+            f"({_index_bytes() / 2**20:.0f} MiB mapped, peak RSS {process_peak_rss_bytes() / 2**20:.0f} MiB)"
+        )
+        if then is not None:
+            try:
+                then()
+            except Exception as exc:
+                print(f"[taxSun] Warm-up step failed: {type(exc).__name__}: {exc}")
+
+
+taxonomy_warmup = TaxonomyWarmup(TAXONOMY_WARMUP)
+
+
+ResolvedLineage = Tuple[str, str, Dict[str, str]]  # (name, rank, rank -> name leaf-first)
+
+
+class LineageCache:
     """
-    ensure_taxdump_present()
+    Process-wide LRU cache of resolved lineages, keyed by taxID.
+
+    The taxonomy is immutable while an index version is loaded, so entries never go stale;
+    the cache is emptied when it is used with a different index version. Size is bounded
+    by an estimate of the bytes held by the cached strings, not by entry count.
+    """
+
+    # Rough per-object overhead of the cached tuples/dicts/strs, in bytes.
+    _ENTRY_OVERHEAD = 200
+    _PAIR_OVERHEAD = 150
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries: "OrderedDict[int, Tuple[ResolvedLineage, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _estimate_size(cls, value: ResolvedLineage) -> int:
+        name, rank, lineage = value
+        return cls._ENTRY_OVERHEAD + len(name) + len(rank) + sum(
+            cls._PAIR_OVERHEAD + len(r) + len(n) for r, n in lineage.items()
+        )
+
+    def _clear(self, version) -> None:
+        self._entries.clear()
+        self._size = 0
+        self.version = version
+
+    def resolve(self, taxdb: TaxonomyIndex, taxids: Sequence[int]) -> List[ResolvedLineage]:
+        """Cached front of `TaxonomyIndex.resolve_lineages`; misses are resolved in one batch."""
+        results: List = [None] * len(taxids)
+        missing: List[int] = []
+
+        with self._lock:
+            if self.version != taxdb.version:
+                self._clear(taxdb.version)
+
+            for i, taxid in enumerate(taxids):
+                cached = self._entries.get(taxid)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(taxid)
+                    results[i] = cached[0]
+            self.hits += len(taxids) - len(missing)
+            self.misses += len(missing)
+
+        if not missing:
+            return results
+
+        resolved = taxdb.resolve_lineages([taxids[i] for i in missing])
+
+        with self._lock:
+            if self.version != taxdb.version:
+                self._clear(taxdb.version)
+
+            for i, value in zip(missing, resolved):
+                results[i] = value
+                if self.max_bytes <= 0 or taxids[i] in self._entries:
+                    continue
+                size = self._estimate_size(value)
+                self._entries[taxids[i]] = (value, size)
+                self._size += size
+
+            while self._size > self.max_bytes and self._entries:
+                _, (_, size) = self._entries.popitem(last=False)
+                self._size -= size
+                self.evictions += 1
+
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+lineage_cache = LineageCache(LINEAGE_CACHE_MAX_BYTES)
+
+
+def resolve_lineages(taxids: Sequence[int]) -> List[ResolvedLineage]:
+    """Resolve (name, rank, rank -> name lineage) for many taxIDs through the shared lineage cache."""
+    return lineage_cache.resolve(get_taxdb(), taxids)
+
 
-    print(f"[taxSun] Using local taxonomy database from {DATA_DIR}")
-    return taxopy.TaxDb(
-        nodes_dmp=str(NODES),
-        names_dmp=str(NAMES),
-        merged_dmp=str(MERGED),
-    )
+if __name__ == "__main__":
+    # Build step: `python -m app.core.taxdb` fetches the taxdump if needed and compiles the index.
+    ensure_taxonomy_index()
@@ -0,0 +1,522 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bump whenever the on-disk layout changes; older indexes are then rebuilt.
+INDEX_FORMAT_VERSION = 3
+
+NO_RANK = "no rank"
+
+PARENT_FILE = "parent.npy"
+RANK_FILE = "rank.npy"
+NAME_OFFSETS_FILE = "name_offsets.npy"
+NAMES_FILE = "names.bin"
+NAME_HASH_FILE = "name_hash.npy"
+MERGED_FILE = "merged.npy"
+FOLDED_TAXIDS_FILE = "folded_taxids.npy"
+FOLDED_OFFSETS_FILE = "folded_offsets.npy"
+FOLDED_NAMES_FILE = "folded_names.bin"
+SUBTREE_START_FILE = "subtree_start.npy"
+SUBTREE_END_FILE = "subtree_end.npy"
+PREORDER_FILE = "preorder.npy"
+META_FILE = "meta.json"
+
+
+def _iter_dmp(path: Path) -> Iterator[List[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.split("\t")
+
+
+def _name_hash(name: bytes) -> int:
+    # crc32 is stable across processes, unlike hash().
+    return zlib.crc32(name)
+
+
+def _fold(name: str) -> bytes:
+    # UTF-8 preserves code point order, so folded names compare and sort correctly as bytes.
+    return name.casefold().encode("utf-8")
+
+
+def source_fingerprint(nodes_dmp: Path, names_dmp: Path, merged_dmp: Optional[Path]) -> Dict[str, List[int]]:
+    """Size and mtime of the taxdump files an index was compiled from."""
+    fingerprint = {}
+    for path in (nodes_dmp, names_dmp, merged_dmp):
+        if path is not None and path.exists():
+            stat = path.stat()
+            fingerprint[path.name] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+
+def read_index_meta(index_dir: Path) -> Optional[dict]:
+    try:
+        return json.loads((index_dir / META_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def index_is_current(index_dir: Path, nodes_dmp: Path, names_dmp: Path, merged_dmp: Optional[Path]) -> bool:
+    meta = read_index_meta(index_dir)
+    return (
+        meta is not None
+        and meta.get("format") == INDEX_FORMAT_VERSION
+        and meta.get("source") == source_fingerprint(nodes_dmp, names_dmp, merged_dmp)
+    )
+
+
+class TaxdumpTables:
+    """
+    The taxdump records an index is compiled from, collected row by row.
+
+    Filled either from the .dmp files (`build_taxonomy_index` without tables) or while the
+    files are being extracted from a taxdump archive, so they need not be read twice.
+    """
+
+    def __init__(self) -> None:
+        self.parents: Dict[int, int] = {}
+        self.ranks: Dict[int, str] = {}
+        self.names: Dict[int, bytes] = {}
+        self.merged: Dict[int, int] = {}
+
+    def add_node(self, cols: List[str]) -> None:
+        taxid = int(cols[0])
+        self.parents[taxid] = int(cols[2])
+        self.ranks[taxid] = cols[4].strip()
+
+    def add_name(self, cols: List[str]) -> None:
+        if cols[6] == "scientific name":
+            self.names[int(cols[0])] = cols[2].strip().encode("utf-8")
+
+    def add_merged(self, cols: List[str]) -> None:
+        self.merged[int(cols[0])] = int(cols[2])
+
+    def row_handler(self, file_name: str) -> Optional[Callable[[List[str]], None]]:
+        """The `add_*` method for rows of the taxdump file `file_name`, None for files the index does not use."""
+        return {"nodes.dmp": self.add_node, "names.dmp": self.add_name, "merged.dmp": self.add_merged}.get(file_name)
+
+    @classmethod
+    def read(cls, nodes_dmp: Path, names_dmp: Path, merged_dmp: Optional[Path]) -> "TaxdumpTables":
+        tables = cls()
+        for path in (nodes_dmp, names_dmp, merged_dmp):
+            if path is not None and path.exists():
+                add = tables.row_handler(path.name)
+                for cols in _iter_dmp(path):
+                    add(cols)
+        return tables
+
+
+def build_taxonomy_index(
+    nodes_dmp: Path,
+    names_dmp: Path,
+    merged_dmp: Optional[Path],
+    index_dir: Path,
+    tables: Optional[TaxdumpTables] = None,
+) -> None:
+    """
+    Compile NCBI taxdump files into a directory of flat arrays that can be memory-mapped.
+
+    Layout (all arrays indexed by taxID, -1/0 where a taxID does not exist):
+      parent.npy        int32 parent taxID (root points to itself)
+      rank.npy          uint8 code into meta["ranks"]
+      name_offsets.npy  int64, scientific name of t is names.bin[offsets[t]:offsets[t + 1]]
+      names.bin         UTF-8 scientific names, concatenated in taxID order
+      name_hash.npy     int32 open-addressing table (crc32 of the name, linear probing) of taxIDs
+      merged.npy        int32 (old taxID, new taxID) pairs sorted by old taxID
+      folded_taxids.npy int32 taxIDs sorted by casefolded scientific name (then taxID)
+      folded_offsets.npy, folded_names.bin
+                        the casefolded names in that order, for binary search
+      subtree_start.npy, subtree_end.npy
+                        int32 DFS entry/exit interval: t's subtree is preorder[start[t]:end[t]]
+      preorder.npy      int32 taxIDs in DFS preorder (children by ascending taxID)
+
+    Merged (old) taxIDs get the parent, rank and name of their replacement, like taxopy does,
+    but are not entered in the name tables, nor in the preorder.
+
+    The index is written to a temporary directory and moved into place at the end, so
+    readers never observe a half-written index.
+
+    `tables`, if given, must hold the records of exactly these files (e.g. collected while
+    extracting them); the files are then only used for the source fingerprint.
+    """
+    if tables is None:
+        tables = TaxdumpTables.read(nodes_dmp, names_dmp, merged_dmp)
+    parents, ranks, names, merged = tables.parents, tables.ranks, tables.names, tables.merged
+
+    rank_table = sorted(set(ranks.values()))
+    if len(rank_table) > 255:
+        raise RuntimeError(f"Too many distinct ranks for a uint8 rank table: {len(rank_table)}")
+    rank_codes = {rank: code for code, rank in enumerate(rank_table)}
+
+    size = max(max(parents, default=0), max(merged, default=0)) + 1
+    parent = np.full(size, -1, dtype=np.int32)
+    rank = np.zeros(size, dtype=np.uint8)
+    for taxid, parent_id in parents.items():
+        parent[taxid] = parent_id
+        rank[taxid] = rank_codes[ranks[taxid]]
+
+    named_taxids = [t for t in sorted(names) if t in parents]
+    name_lengths = np.zeros(size, dtype=np.int64)
+
+    for old, new in merged.items():
+        if new in parents and new in names:
+            parent[old] = parent[new]
+            rank[old] = rank[new]
+            names[old] = names[new]
+
+    ordered = sorted(t for t in names if parent[t] >= 0)
+    for taxid in ordered:
+        name_lengths[taxid] = len(names[taxid])
+    name_offsets = np.concatenate(([0], np.cumsum(name_lengths))).astype(np.int64)
+
+    slots = [0] * (1 << max(4, (2 * len(named_taxids)).bit_length()))
+    mask = len(slots) - 1
+    for taxid in named_taxids:
+        slot = _name_hash(names[taxid]) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = taxid
+
+    merged_pairs = np.array(sorted(merged.items()), dtype=np.int32).reshape(-1, 2)
+
+    nodes = np.fromiter(parents, dtype=np.int64, count=len(parents))
+    subtree_start, subtree_end, preorder = _euler_intervals(size, nodes, parent[nodes].astype(np.int64))
+    for old, new in merged.items():
+        if new in parents:
+            subtree_start[old] = subtree_start[new]
+            subtree_end[old] = subtree_end[new]
+
+    folded = sorted((_fold(names[t].decode("utf-8")), t) for t in named_taxids)
+    folded_taxids = np.array([t for _, t in folded], dtype=np.int32)
+    folded_offsets = np.concatenate(([0], np.cumsum([len(f) for f, _ in folded], dtype=np.int64))).astype(np.int64)
+
+    meta = {
+        "format": INDEX_FORMAT_VERSION,
+        "ranks": rank_table,
+        "source": source_fingerprint(nodes_dmp, names_dmp, merged_dmp),
+    }
+    meta["version"] = hashlib.sha1(json.dumps(meta, sort_keys=True).encode()).hexdigest()[:12]
+
+    tmp_dir = index_dir.with_name(f"{index_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    np.save(tmp_dir / PARENT_FILE, parent)
+    np.save(tmp_dir / RANK_FILE, rank)
+    np.save(tmp_dir / NAME_OFFSETS_FILE, name_offsets)
+    np.save(tmp_dir / NAME_HASH_FILE, np.array(slots, dtype=np.int32))
+    np.save(tmp_dir / MERGED_FILE, merged_pairs)
+    np.save(tmp_dir / FOLDED_TAXIDS_FILE, folded_taxids)
+    np.save(tmp_dir / FOLDED_OFFSETS_FILE, folded_offsets)
+    np.save(tmp_dir / SUBTREE_START_FILE, subtree_start)
+    np.save(tmp_dir / SUBTREE_END_FILE, subtree_end)
+    np.save(tmp_dir / PREORDER_FILE, preorder)
+    with open(tmp_dir / NAMES_FILE, "wb") as f:
+        for taxid in ordered:
+            f.write(names[taxid])
+    with open(tmp_dir / FOLDED_NAMES_FILE, "wb") as f:
+        for name, _ in folded:
+            f.write(name)
+    (tmp_dir / META_FILE).write_text(json.dumps(meta))
+
+    swap_index_dir(tmp_dir, index_dir)
+
+
+def _euler_intervals(size: int, nodes: np.ndarray, parents: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    DFS entry/exit positions of every node, without a per-node Python loop.
+
+    Nodes are grouped by depth (one vectorized pass per taxonomy level). Subtree sizes are
+    summed bottom-up; then, top-down, each child starts right after its parent plus the
+    subtrees of its smaller-taxID siblings. The exit position is entry + subtree size.
+    Nodes that cannot reach a root (broken or cyclic parent links) keep -1 and are left out
+    of the preorder.
+    """
+    is_root = parents == nodes
+    depth = np.full(size, -1, dtype=np.int64)
+    depth[nodes[is_root]] = 0
+    levels = [nodes[is_root]]
+    pending = ~is_root
+    while True:
+        reached = pending & (depth[parents] == len(levels) - 1)
+        if not reached.any():
+            break
+        depth[nodes[reached]] = len(levels)
+        levels.append(nodes[reached])
+        pending &= ~reached
+
+    subtree_size = np.zeros(size, dtype=np.int64)
+    subtree_size[nodes[depth[nodes] >= 0]] = 1
+    parent_of = np.full(size, -1, dtype=np.int64)
+    parent_of[nodes] = parents
+    for level in reversed(levels[1:]):
+        np.add.at(subtree_size, parent_of[level], subtree_size[level])
+
+    start = np.full(size, -1, dtype=np.int64)
+    # Roots are laid out one after another (NCBI has a single root, taxID 1).
+    roots = levels[0]
+    start[roots] = np.cumsum(subtree_size[roots]) - subtree_size[roots]
+    for level in levels[1:]:
+        # `level` is in taxID order; a stable sort by parent keeps siblings in taxID order.
+        level = level[np.argsort(parent_of[level], kind="stable")]
+        sizes = subtree_size[level]
+        before = np.cumsum(sizes) - sizes
+        level_parents = parent_of[level]
+        new_group = np.r_[True, level_parents[1:] != level_parents[:-1]]
+        group_first = np.flatnonzero(new_group)[np.cumsum(new_group) - 1]
+        start[level] = start[level_parents] + 1 + before - before[group_first]
+
+    placed = start >= 0
+    end = np.where(placed, start + subtree_size, -1)
+    preorder = np.empty(int(placed.sum()), dtype=np.int32)
+    preorder[start[placed]] = np.flatnonzero(placed)
+    return start.astype(np.int32), end.astype(np.int32), preorder
+
+
+def swap_index_dir(new_dir: Path, index_dir: Path) -> None:
+    """Move a complete index directory into place; processes that already mapped the old files keep reading them."""
+    old_dir = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+    if index_dir.exists():
+        index_dir.replace(old_dir)
+    new_dir.replace(index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class TaxonomyIndex:
+    """
+    Read-only view of a compiled taxonomy index.
+
+    All arrays are memory-mapped, so opening is cheap and every worker process
+    shares the same physical pages through the page cache.
+    """
+
+    def __init__(self, index_dir: Path) -> None:
+        meta = read_index_meta(index_dir)
+        if meta is None or meta.get("format") != INDEX_FORMAT_VERSION:
+            raise RuntimeError(f"No usable taxonomy index in {index_dir}")
+
+        self.index_dir = index_dir
+        self.version: str = meta["version"]
+        self.rank_names: List[str] = meta["ranks"]
+
+        self.parent = np.load(index_dir / PARENT_FILE, mmap_mode="r")
+        self.rank = np.load(index_dir / RANK_FILE, mmap_mode="r")
+        self.name_offsets = np.load(index_dir / NAME_OFFSETS_FILE, mmap_mode="r")
+        self.name_hash = np.load(index_dir / NAME_HASH_FILE, mmap_mode="r")
+        self.merged = np.load(index_dir / MERGED_FILE, mmap_mode="r")
+
+        self.folded_taxids = np.load(index_dir / FOLDED_TAXIDS_FILE, mmap_mode="r")
+        self.folded_offsets = np.load(index_dir / FOLDED_OFFSETS_FILE, mmap_mode="r")
+
+        self.subtree_start = np.load(index_dir / SUBTREE_START_FILE, mmap_mode="r")
+        self.subtree_end = np.load(index_dir / SUBTREE_END_FILE, mmap_mode="r")
+        self.preorder = np.load(index_dir / PREORDER_FILE, mmap_mode="r")
+
+        self._names = self._map(index_dir / NAMES_FILE)
+        self._folded_names = self._map(index_dir / FOLDED_NAMES_FILE)
+
+    @staticmethod
+    def _map(path: Path):
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __contains__(self, taxid: int) -> bool:
+        return 0 <= taxid < len(self.parent) and self.parent[taxid] >= 0
+
+    def _check(self, taxid: int) -> None:
+        if taxid not in self:
+            raise ValueError(f"{taxid} is not a valid NCBI taxonomic identifier.")
+
+    def name(self, taxid: int) -> str:
+        self._check(taxid)
+        return self._names[self.name_offsets[taxid] : self.name_offsets[taxid + 1]].decode("utf-8")
+
+    def rank_of(self, taxid: int) -> str:
+        self._check(taxid)
+        return self.rank_names[self.rank[taxid]]
+
+    def taxid_lineage(self, taxid: int) -> List[int]:
+        """TaxIDs from `taxid` up to the root, both included."""
+        self._check(taxid)
+        parent = self.parent
+        lineage = [taxid]
+        current = taxid
+        while int(parent[current]) != current:
+            current = int(parent[current])
+            lineage.append(current)
+        return lineage
+
+    def rank_name_lineage(self, taxid: int) -> Dict[str, str]:
+        """
+        Rank -> name along the lineage, leaf first, "no rank" nodes skipped.
+
+        Same semantics as taxopy's `Taxon.rank_name_dictionary`: a rank that occurs
+        several times keeps the position of its lowest occurrence and the name of its highest.
+        """
+        rank_names = self.rank_names
+        lineage: Dict[str, str] = OrderedDict()
+        for node in self.taxid_lineage(taxid):
+            rank = rank_names[self.rank[node]]
+            if rank != NO_RANK:
+                lineage[rank] = self.name(node)
+        return lineage
+
+    def resolve_lineages(self, taxids: Sequence[int]) -> List[Tuple[str, str, Dict[str, str]]]:
+        """
+        Batch version of `name`, `rank_of` and `rank_name_lineage` for many taxIDs at once.
+
+        Lineages are resolved level by level with one vectorized parent lookup per taxonomy
+        level for all taxIDs together, and each distinct ancestor's name is decoded only once,
+        however many of the input taxa share it.
+
+        Returns (name, rank, rank_name_lineage) per input taxID, in input order.
+        """
+        ids = np.asarray(taxids, dtype=np.int64)
+        if len(ids) == 0:
+            return []
+
+        parent = self.parent
+        in_range = (ids >= 0) & (ids < len(parent))
+        valid = in_range.copy()
+        valid[in_range] = parent[ids[in_range]] >= 0
+        if not valid.all():
+            self._check(int(ids[np.argmin(valid)]))
+
+        # levels[d][i] is the ancestor of ids[i] at distance d; taxa that reached the root stay there.
+        levels = [ids]
+        current = ids
+        while True:
+            above = parent[current].astype(np.int64)
+            if (above == current).all():
+                break
+            levels.append(above)
+            current = above
+        matrix = np.stack(levels)
+
+        ancestors, inverse = np.unique(matrix, return_inverse=True)
+        inverse = inverse.reshape(matrix.shape)
+        rank_names = self.rank_names
+        ancestor_names = [self.name(int(t)) for t in ancestors]
+        ancestor_ranks = [rank_names[r] for r in self.rank[ancestors].tolist()]
+
+        # Taxa with shorter lineages repeat the root at the bottom of their column,
+        # which leaves the rank dictionary unchanged.
+        resolved = []
+        for column in inverse.T.tolist():
+            lineage: Dict[str, str] = OrderedDict()
+            for node in column:
+                rank = ancestor_ranks[node]
+                if rank != NO_RANK:
+                    lineage[rank] = ancestor_names[node]
+            leaf = column[0]
+            resolved.append((ancestor_names[leaf], ancestor_ranks[leaf], lineage))
+        return resolved
+
+    def is_ancestor(self, ancestor: int, taxid: int) -> bool:
+        """
+        Whether `ancestor` is in the lineage of `taxid` (a taxon is its own ancestor); O(1).
+
+        A merged taxID stands for its replacement, on either side.
+        """
+        self._check(ancestor)
+        self._check(taxid)
+        start = self.subtree_start
+        return int(start[ancestor]) <= int(start[taxid]) < int(self.subtree_end[ancestor])
+
+    def in_subtree(self, ancestor: int, taxids: Sequence[int]) -> np.ndarray:
+        """Vectorized `is_ancestor(ancestor, t)` for many taxIDs; unknown taxIDs are never in the subtree."""
+        self._check(ancestor)
+        ids = np.asarray(taxids, dtype=np.int64)
+        positions = np.full(len(ids), -1, dtype=np.int64)
+        in_range = (ids >= 0) & (ids < len(self.subtree_start))
+        positions[in_range] = self.subtree_start[ids[in_range]]
+        return (positions >= self.subtree_start[ancestor]) & (positions < self.subtree_end[ancestor])
+
+    def subtree(self, taxid: int) -> np.ndarray:
+        """All taxIDs under `taxid` (itself first) in DFS preorder, as a slice of the mapped preorder."""
+        self._check(taxid)
+        return self.preorder[self.subtree_start[taxid] : self.subtree_end[taxid]]
+
+    def subtree_totals(self, taxids: Sequence[int], counts: Sequence[float], ancestors: Sequence[int]) -> np.ndarray:
+        """
+        For each of `ancestors`, the sum of `counts` over the `taxids` in its subtree.
+
+        One prefix sum over the counts in preorder position order, then two binary
+        searches per ancestor, instead of walking every lineage up to the root.
+        """
+        ids = np.asarray(taxids, dtype=np.int64)
+        for taxid in set(ids.tolist()) | set(ancestors):
+            self._check(int(taxid))
+        positions = self.subtree_start[ids].astype(np.int64)
+        order = np.argsort(positions, kind="stable")
+        positions = positions[order]
+        prefix = np.concatenate(([0], np.cumsum(np.asarray(counts)[order])))
+
+        heads = np.asarray(ancestors, dtype=np.int64)
+        lo = np.searchsorted(positions, self.subtree_start[heads], side="left")
+        hi = np.searchsorted(positions, self.subtree_end[heads], side="left")
+        return prefix[hi] - prefix[lo]
+
+    def taxids_by_name(self, name: str, ignore_case: bool = False) -> List[int]:
+        """All current (non-merged) taxIDs whose scientific name is `name` (exactly, or ignoring case)."""
+        if ignore_case:
+            key = _fold(name)
+            matches = []
+            for i in range(self._folded_search(key), len(self.folded_taxids)):
+                if self._folded_name(i) != key:
+                    break
+                matches.append(int(self.folded_taxids[i]))
+            return sorted(matches)
+
+        encoded = name.encode("utf-8")
+        slots = self.name_hash
+        mask = len(slots) - 1
+        slot = _name_hash(encoded) & mask
+
+        matches = []
+        while True:
+            taxid = int(slots[slot])
+            if taxid == 0:
+                break
+            if self._names[self.name_offsets[taxid] : self.name_offsets[taxid + 1]] == encoded:
+                matches.append(taxid)
+            slot = (slot + 1) & mask
+        return sorted(matches)
+
+    def search_names(self, prefix: str, limit: int = 20) -> List[Tuple[str, int]]:
+        """
+        Up to `limit` (scientific name, taxID) pairs whose name starts with `prefix`, ignoring case.
+
+        Ordered by casefolded name, then taxID.
+        """
+        key = _fold(prefix)
+        matches = []
+        for i in range(self._folded_search(key), len(self.folded_taxids)):
+            if len(matches) >= limit or not self._folded_name(i).startswith(key):
+                break
+            taxid = int(self.folded_taxids[i])
+            matches.append((self.name(taxid), taxid))
+        return matches
+
+    def _folded_name(self, i: int) -> bytes:
+        return self._folded_names[self.folded_offsets[i] : self.folded_offsets[i + 1]]
+
+    def _folded_search(self, key: bytes) -> int:
+        """Position of the first casefolded name >= `key` (binary search over the mapped names)."""
+        lo, hi = 0, len(self.folded_taxids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._folded_name(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
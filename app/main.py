@@ -1,11 +1,28 @@
 # app/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from app.core.compression import add_compression
 from app.core.cors import add_cors
-from app.routers import dataset, lookup
+from app.core.executor import dataset_executor
+from app.core.taxdb import lineage_cache, taxonomy_ready, taxonomy_refresher, taxonomy_version, taxonomy_warmup
+from app.routers import dataset, jobs, lookup, metrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the taxonomy before the first upload needs it; /ready reports when that is done.
+    taxonomy_warmup.start(then=dataset_executor.warm_up)
+    # New NCBI releases are fetched and compiled in the background, then swapped in without restarts.
+    taxonomy_refresher.start()
+    yield
+    taxonomy_refresher.stop()
+    dataset_executor.shutdown()
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="taxSun API")
+    app = FastAPI(title="taxSun API", lifespan=lifespan)
     add_cors(app)
+    add_compression(app)
 
     @app.get("/")
     def root():
@@ -13,10 +30,21 @@ def create_app() -> FastAPI:
 
     @app.get("/health")
     def health():
-        return {"healthy": True}
+        # Liveness only; use /ready to decide whether to route uploads to this worker.
+        return {"healthy": True, "ready": taxonomy_ready(), "taxonomyVersion": taxonomy_version(), "lineageCache": lineage_cache.stats()}
+
+    @app.get("/ready")
+    def ready():
+        if not taxonomy_ready():
+            # Starts the load if nothing is loading it (warm-up disabled), so readiness does not wait for a request.
+            taxonomy_warmup.ensure_started()
+            return JSONResponse(status_code=503, content={"ready": False, "error": taxonomy_warmup.error})
+        return {"ready": True, "taxonomyVersion": taxonomy_version()}
 
     app.include_router(dataset.router)
     app.include_router(lookup.router)
+    app.include_router(jobs.router)
+    app.include_router(metrics.router)
 
     return app
 
@@ -1,12 +1,75 @@
-from fastapi import APIRouter, UploadFile
-from app.services.dataset_service import process_tsv_dataset, process_faa_dataset
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Header, Query, UploadFile
+from pydantic import BaseModel
+from app.core.config import HIT_TOP_K
+from app.services.comparison_service import process_tsv_samples
+from app.services.dataset_service import (
+    fetch_dataset_children,
+    fetch_dataset_hits,
+    fetch_dataset_rank,
+    fetch_faa_sequences,
+    process_faa_dataset,
+    process_tsv_dataset,
+    process_tsv_session,
+    resolve_response_format,
+)
+from app.services.job_service import submit_tsv_job
 
 router = APIRouter()
 
 @router.post("/load_tsv_data")
-async def process_tsv(file: UploadFile):
-    return await process_tsv_dataset(file)
+async def process_tsv(
+    file: UploadFile,
+    mode: Literal["sync", "async", "session"] = "sync",
+    format: Optional[str] = Query(None, description="json (default), compact or msgpack"),
+    top_hits: Optional[int] = Query(None, alias="topHits", ge=0, description="best hits kept per taxon, 0 for all"),
+    accept: Optional[str] = Header(None),
+):
+    response_format = resolve_response_format(format, accept)
+    top_k = HIT_TOP_K if top_hits is None else top_hits
+
+    # mode=async returns a job ID immediately; poll /jobs/{id} and fetch /jobs/{id}/result.
+    if mode == "async":
+        return await submit_tsv_job(file, response_format, top_k)
+    # mode=session keeps the processed dataset on the server and returns its ID and the root level only.
+    if mode == "session":
+        return await process_tsv_session(file)
+    return await process_tsv_dataset(file, response_format, top_k)
+
+@router.post("/compare_tsv_data")
+async def compare_tsv(files: List[UploadFile]):
+    # Several samples in one request: one merged tree plus taxa x samples count matrices.
+    return await process_tsv_samples(files)
 
 @router.post("/load_faa_data")
-async def process_faa(file: UploadFile):
-    return await process_faa_dataset(file)
+async def process_faa(file: UploadFile, sequences: bool = True):
+    # sequences=false leaves out faaObj; fetch what is needed from /faa_data/{faaStoreId}/sequences instead.
+    return await process_faa_dataset(file, sequences)
+
+class FaaSequencesRequest(BaseModel):
+    headers: List[str]
+
+@router.post("/faa_data/{store_id}/sequences")
+async def faa_sequences(store_id: str, body: FaaSequencesRequest):
+    return await fetch_faa_sequences(store_id, body.headers)
+
+@router.get("/datasets/{dataset_id}/children")
+async def dataset_children(dataset_id: str, taxon: str = "root root"):
+    return await fetch_dataset_children(dataset_id, taxon)
+
+@router.get("/datasets/{dataset_id}/hits")
+async def dataset_hits(dataset_id: str, taxon: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000)):
+    # Hits of one taxon, sorted by e-value; `total` tells how many pages there are.
+    return await fetch_dataset_hits(dataset_id, taxon, offset, limit)
+
+@router.get("/datasets/{dataset_id}/ranks/{rank}")
+async def dataset_rank(
+    dataset_id: str,
+    rank: str,
+    limit: int = Query(20, ge=1, le=10000),
+    min_count: int = Query(0, alias="minCount", ge=0),
+    sort_by: Literal["totCount", "unaCount"] = Query("totCount", alias="sortBy"),
+):
+    # e.g. the 20 most abundant genera: /datasets/{id}/ranks/genus?limit=20
+    return await fetch_dataset_rank(dataset_id, rank, limit, min_count, sort_by)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from app.services.job_service import get_job_result, get_job_status
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return get_job_status(job_id)
+
+@router.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    return get_job_result(job_id)
@@ -1,10 +1,56 @@
-from fastapi import APIRouter, Request
-from app.services.lookup_service import resolve_id_by_name
+from typing import List, Union
+
+from fastapi import APIRouter, Query
+from pydantic import BaseModel
+from app.services.lookup_service import (
+    check_ancestry,
+    list_subtree,
+    resolve_id_by_name,
+    resolve_ids_by_names,
+    search_taxa_by_name,
+    sum_subtree_counts,
+)
 
 router = APIRouter()
 
+class NameLookup(BaseModel):
+    taxName: str
+
+# Lookups are plain `def` routes: they run in the threadpool, so a lookup that has to wait
+# for the taxonomy never blocks the event loop (and with it /ready and /health).
 @router.post("/fetchID")
-async def id_by_name(request: Request):
-    data = await request.json()
-    taxon_name = data["taxName"]
-    return resolve_id_by_name(taxon_name)
+def id_by_name(body: NameLookup):
+    return resolve_id_by_name(body.taxName)
+
+class NamesLookup(BaseModel):
+    taxNames: List[str]
+    ignoreCase: bool = False
+
+@router.post("/fetchIDs")
+def ids_by_names(body: NamesLookup):
+    return resolve_ids_by_names(body.taxNames, body.ignoreCase)
+
+@router.get("/searchNames")
+def names_by_prefix(prefix: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=1000)):
+    return search_taxa_by_name(prefix, limit)
+
+class AncestryQuery(BaseModel):
+    ancestor: int
+    taxIDs: List[int]
+
+@router.post("/isAncestor")
+def ancestry(body: AncestryQuery):
+    return check_ancestry(body.ancestor, body.taxIDs)
+
+@router.get("/subtree/{taxid}")
+def subtree(taxid: int, limit: int = Query(1000, ge=0, le=100000)):
+    return list_subtree(taxid, limit)
+
+class SubtreeTotalsQuery(BaseModel):
+    taxIDs: List[int]
+    counts: List[Union[int, float]]
+    ancestors: List[int]
+
+@router.post("/subtreeTotals")
+def subtree_totals(body: SubtreeTotalsQuery):
+    return sum_subtree_counts(body.taxIDs, body.counts, body.ancestors)
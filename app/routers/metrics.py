@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.executor import dataset_executor
+from app.core.metrics import dataset_jobs_active, lineage_cache_stats, registry
+from app.core.taxdb import lineage_cache
+
+router = APIRouter()
+
+@router.get("/metrics")
+def metrics():
+    # Prometheus text format; every server worker process reports its own counters.
+    for stat, value in lineage_cache.stats().items():
+        lineage_cache_stats.set(value, stat=stat)
+    dataset_jobs_active.set(dataset_executor.active)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
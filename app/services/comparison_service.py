@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from app.core.config import ALLOWED_RANKS, COMPARE_MAX_SAMPLES, PARSE_SHARDS
+from app.core.executor import dataset_executor
+from app.core.metrics import StageTimer, input_bytes, record_report
+from app.services.dataset_service import finish_timed, build_tree, spool_upload
+from app.utils.abundance import sample_count_matrices
+from app.utils.parsing import build_raw_taxon_index_samples
+from app.utils.serialization import encode_compact_json
+
+
+async def process_tsv_samples(files: List[Any]) -> Response:
+    """Compare several TSV uploads (samples) in one job, against one merged tree."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(files) > COMPARE_MAX_SAMPLES:
+        raise HTTPException(status_code=413, detail=f"At most {COMPARE_MAX_SAMPLES} samples can be compared at once")
+
+    started = time.perf_counter()
+    paths = []
+    try:
+        for file in files:
+            path, _ = await spool_upload(file)
+            paths.append(path)
+            input_bytes.observe(path.stat().st_size, pipeline="samples")
+        server_stages = {"upload": time.perf_counter() - started}
+
+        names = [file.filename or f"sample{i + 1}" for i, file in enumerate(files)]
+        submitted = time.perf_counter()
+        body, report = await dataset_executor.run(render_sample_comparison, [str(p) for p in paths], names)
+        server_stages["queue"] = max(0.0, time.perf_counter() - submitted - report["seconds"])
+        record_report("samples", report)
+
+        return finish_timed(Response(body, media_type="application/json"), "samples", started, server_stages, report["stages"])
+    finally:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+
+def render_sample_comparison(paths: List[str], names: List[str]) -> Tuple[bytes, Dict[str, Any]]:
+    timer = StageTimer()
+    comparison = build_sample_comparison(paths, names, timer)
+    timer("serializing")
+    return encode_compact_json(comparison), timer.report()
+
+
+def build_sample_comparison(paths: List[str], names: List[str], progress=None) -> Dict[str, Any]:
+    """
+    Merged tree of several samples plus their abundance matrices.
+
+    Lineages are resolved once for the union of the samples' taxIDs and the tree is built
+    once, instead of once per sample. Summed over the samples, the counts are those of one
+    /load_tsv_data run on all samples' lines; a single sample's column equals its own run
+    except where taxa sharing a name and rank (which are one node) gain paths from other
+    samples. Layout (taxa referred to by position, like the compact format):
+      taxa        columns key/name/rank/taxID/lnIndex/directChildren of the merged tree
+      unaCounts   taxa x samples matrix (row i belongs to taxon i)
+      totCounts   taxa x samples matrix
+      lns         lineages as arrays of taxon positions
+    """
+    if progress is not None:
+        progress("parsing")
+    raw_index, sample_of_row, lines_per_sample = build_raw_taxon_index_samples(paths, PARSE_SHARDS > 1, progress)
+    raw_tax_set, raw_lns, hits, _, _ = raw_index
+
+    if progress is not None:
+        progress("building tree")
+    tax_set, lns = build_tree(raw_tax_set, raw_lns, False, False)
+
+    if progress is not None:
+        progress("counting")
+    una, tot = sample_count_matrices(tax_set, hits, sample_of_row, len(paths))
+
+    taxon_ids = {key: i for i, key in enumerate(tax_set)}
+    taxa: Dict[str, List[Any]] = {"key": [], "name": [], "rank": [], "taxID": [], "lnIndex": [], "directChildren": []}
+    for key, obj in tax_set.items():
+        taxa["key"].append(key)
+        taxa["name"].append(obj["name"])
+        taxa["rank"].append(obj["rank"])
+        taxa["taxID"].append(obj["taxID"])
+        taxa["lnIndex"].append(obj["lnIndex"])
+        taxa["directChildren"].append([taxon_ids[child] for child in obj["directChildren"]])
+
+    return {
+        "format": "samples",
+        "samples": names,
+        "linesParsed": lines_per_sample,
+        "taxa": taxa,
+        "unaCounts": una.tolist(),
+        "totCounts": tot.tolist(),
+        "lns": [[taxon_ids[f"{name} {rank}"] for rank, name in ln] for ln in lns],
+        "rankPatternFull": ALLOWED_RANKS,
+    }
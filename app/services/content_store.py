@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Callable, Tuple, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+_ENTRY_ID = re.compile(r"[0-9a-f]{64}")
+
+
+class ContentStore:
+    """
+    Base of the on-disk stores keyed by a SHA-256 of their content (`FastaStore`, `SessionStore`).
+
+    Layout: <root>/<entry ID>/ with `marker_file` written last, so its presence marks a complete
+    entry. Entries are built in a temporary directory and renamed into place, opening one marks
+    it as used, and `sweep` deletes those not used for `ttl_seconds`.
+
+    Subclasses set `kind` (for error messages), `marker_file` and `_load`, which parses the
+    marker file; `_open` calls it with the file's mtime so it can be an `lru_cache`d function.
+    """
+
+    kind = "entry"
+    marker_file = ""
+
+    def __init__(self, root: Path, ttl_seconds: int) -> None:
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _load(marker_path: str, mtime_ns: int) -> Any:
+        raise NotImplementedError
+
+    def _entry_dir(self, entry_id: str) -> Path:
+        if not _ENTRY_ID.fullmatch(entry_id):
+            raise HTTPException(status_code=404, detail=f"Unknown {self.kind}: {entry_id}")
+        return self.root / entry_id
+
+    def contains(self, entry_id: str) -> bool:
+        return (self._entry_dir(entry_id) / self.marker_file).exists()
+
+    def _write(self, entry_id: str, fill: Callable[[Path], T]) -> T:
+        """Build an entry with `fill(tmp_dir)`, then move it into place; returns what `fill` returns."""
+        entry_dir = self._entry_dir(entry_id)
+        tmp_dir = self.root / f".{entry_id}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        try:
+            result = fill(tmp_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        try:
+            tmp_dir.replace(entry_dir)
+        except OSError:
+            # Another worker stored the same content first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return result
+
+    def _open(self, entry_id: str) -> Tuple[Path, Any]:
+        """The entry's directory and its parsed marker file; marks the entry as used."""
+        entry_dir = self._entry_dir(entry_id)
+        marker_path = entry_dir / self.marker_file
+        try:
+            mtime_ns = marker_path.stat().st_mtime_ns
+            os.utime(entry_dir)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Unknown or expired {self.kind}: {entry_id}")
+        # mtime_ns is part of the cache key only, so a rebuilt entry is never served from a stale parse.
+        return entry_dir, self._load(str(marker_path), mtime_ns)
+
+    def sweep(self) -> None:
+        """Delete entries (and abandoned temporary directories) not used for `ttl_seconds`."""
+        if not self.root.is_dir():
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for entry in self.root.iterdir():
+            try:
+                expired = entry.stat().st_mtime < cutoff
+            except FileNotFoundError:
+                continue
+            if expired:
+                shutil.rmtree(entry, ignore_errors=True)
@@ -1,31 +1,291 @@
-from app.core.config import ALLOWED_RANKS
-from app.utils.parsing import build_raw_taxon_index, build_rank_filtered_taxon_set
+import os
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import ALLOWED_RANKS, PARSE_SHARDS, SERVER_TIMING, SESSION_TTL_SECONDS, TREE_BUILDER, UPLOAD_SPOOL_DIR
+from app.core.executor import dataset_executor
+from app.core.metrics import (
+    StageTimer,
+    input_bytes,
+    record_report,
+    request_seconds,
+    result_cache_requests,
+    server_timing,
+    stage_seconds,
+)
+from app.services.fasta_store import fasta_store
+from app.services.result_cache import result_cache
+from app.services.session_store import session_store
+from app.utils.fasta import iter_fasta_records
+from app.utils.hits import materialize_hits, materialize_sorted_hits
+from app.utils.parsing import (
+    ProgressCallback,
+    build_rank_filtered_taxon_set,
+    build_raw_taxon_index,
+    build_raw_taxon_index_sharded,
+)
+from app.utils.serialization import RESPONSE_FORMATS, encode_json, msgpack, render_dataset
 from app.utils.sorting import dedupe_and_sort_lineages, propagate_counts_and_build_children, sort_hits_by_evalue
+from app.utils.streaming import iter_chunks, iter_lines, open_upload, spool_to_file, upload_compression
+from app.utils.tree import build_taxon_tree
+
+def resolve_response_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the /load_tsv_data response format from the `format` query parameter or the Accept header.
+
+    The plain JSON format stays the default, so existing clients are unaffected.
+    """
+    response_format = requested
+    if response_format is None and accept:
+        for candidate, media_type in RESPONSE_FORMATS.items():
+            if media_type in accept:
+                response_format = candidate
+                break
+        if response_format is None and "application/x-msgpack" in accept:
+            response_format = "msgpack"
+
+    response_format = response_format or "json"
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=406, detail=f"Unknown format {response_format!r}, expected one of {list(RESPONSE_FORMATS)}")
+    if response_format == "msgpack" and msgpack is None:
+        raise HTTPException(status_code=406, detail="MessagePack output is not available on this server")
+    return response_format
+
+async def spool_upload(file) -> Tuple[Path, str]:
+    """
+    Copy an upload to a named file (hashing it on the way) so a pool process can read it.
+
+    Uploads may be gzip- or zstd-compressed; an unsupported compression is rejected here,
+    before any work is queued.
+    """
+    path, digest = await run_in_threadpool(spool_to_file, file.file, UPLOAD_SPOOL_DIR)
+    try:
+        await run_in_threadpool(upload_compression, str(path))
+    except HTTPException:
+        path.unlink(missing_ok=True)
+        raise
+    return path, digest
+
+def finish_timed(response: Response, pipeline: str, started: float, server_stages: Dict[str, float], worker_stages: Dict[str, float]) -> Response:
+    # Worker stages were recorded with the worker's report; only the server-side ones are left.
+    for stage, seconds in server_stages.items():
+        stage_seconds.observe(seconds, pipeline=pipeline, stage=stage)
+    total = time.perf_counter() - started
+    request_seconds.observe(total, pipeline=pipeline)
+
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing({**server_stages, **worker_stages, "total": total})
+    return response
+
+def cached_response(body: BinaryIO, media_type: str) -> StreamingResponse:
+    # Streamed from the already open cache entry, which eviction cannot take away any more.
+    size = os.fstat(body.fileno()).st_size
+    return StreamingResponse(iter_chunks(body), media_type=media_type, headers={"Content-Length": str(size)})
+
+async def process_tsv_dataset(file, response_format: str = "json", top_k: int = 0):
+    started = time.perf_counter()
+    path, digest = await spool_upload(file)
+    server_stages = {"upload": time.perf_counter() - started}
+    media_type = RESPONSE_FORMATS[response_format]
+    try:
+        input_bytes.observe(path.stat().st_size, pipeline="tsv")
+
+        cache_key = None
+        if result_cache.enabled:
+            cache_key = result_cache.key(digest, response_format, top_k)
+            cached = await run_in_threadpool(result_cache.get, cache_key)
+            result_cache_requests.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                return finish_timed(cached_response(cached, media_type), "tsv", started, server_stages, {})
+
+        submitted = time.perf_counter()
+        body, report = await dataset_executor.run(render_tsv_dataset, str(path), None, response_format, top_k)
+        server_stages["queue"] = max(0.0, time.perf_counter() - submitted - report["seconds"])
+        record_report("tsv", report)
+
+        if cache_key is not None:
+            await run_in_threadpool(result_cache.put, cache_key, body)
+
+        return finish_timed(Response(body, media_type=media_type), "tsv", started, server_stages, report["stages"])
+    finally:
+        path.unlink(missing_ok=True)
+
+def render_tsv_dataset(
+    path: str,
+    progress: Optional[ProgressCallback] = None,
+    response_format: str = "json",
+    top_k: int = 0,
+) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Runs in a pool process: returning the rendered body avoids pickling the whole result dict back.
+    Also returns the `StageTimer` report, so the server can record where the time went.
+    """
+    timer = StageTimer(progress)
+    dataset = build_tsv_dataset_from_path(path, timer, top_k)
+    timer("serializing")
+    body = render_dataset(dataset, response_format)
+    return body, timer.report()
+
+def build_tsv_dataset_from_path(path: str, progress: Optional[ProgressCallback] = None, top_k: int = 0) -> Dict[str, Any]:
+    # Shards are byte ranges of the file, so compressed uploads are parsed in one stream.
+    if PARSE_SHARDS > 1 and upload_compression(path) is None:
+        if progress is not None:
+            progress("parsing")
+        return build_tsv_dataset_from_index(build_raw_taxon_index_sharded(path, PARSE_SHARDS, progress), progress, top_k)
+    with open_upload(path) as stream:
+        return build_tsv_dataset(stream, progress, top_k)
+
+def build_tsv_dataset(stream: BinaryIO, progress: Optional[ProgressCallback] = None, top_k: int = 0) -> Dict[str, Any]:
+    lines = iter_lines(stream)
+    header_line = next(lines, "")
+
+    if progress is not None:
+        progress("parsing")
+    return build_tsv_dataset_from_index(build_raw_taxon_index(header_line, lines, progress), progress, top_k)
+
+def build_tree(raw_tax_set: Dict[str, Any], raw_lns: List, e_value_enabled: bool, fasta_enabled: bool) -> Tuple[Dict[str, Any], List]:
+    """Rank-filtered tax_set (counts propagated, hits still unmaterialized) and lineages, with the configured TREE_BUILDER."""
+    if TREE_BUILDER == "legacy":
+        tax_set, lns = build_rank_filtered_taxon_set(raw_tax_set, raw_lns, e_value_enabled, fasta_enabled)
+        lns = dedupe_and_sort_lineages(lns)
+        return propagate_counts_and_build_children(lns, tax_set), lns
+    return build_taxon_tree(raw_tax_set, raw_lns, e_value_enabled, fasta_enabled)
+
+def build_tsv_dataset_from_index(raw_index: Tuple, progress: Optional[ProgressCallback] = None, top_k: int = 0) -> Dict[str, Any]:
+    """With top_k > 0, taxa keep only their best `top_k` hits (see `materialize_sorted_hits`)."""
+    raw_tax_set, raw_lns, hits, e_value_enabled, fasta_enabled = raw_index
+
+    if progress is not None:
+        progress("building tree")
+    tax_set, lns = build_tree(raw_tax_set, raw_lns, e_value_enabled, fasta_enabled)
+
+    if progress is not None:
+        progress("sorting hits")
+    if TREE_BUILDER == "legacy":
+        tax_set = materialize_hits(tax_set, hits)
+        tax_set = sort_hits_by_evalue(tax_set)
+        if top_k > 0:
+            for obj in tax_set.values():
+                obj["hitCount"] = len(obj["names"])
+                for field in ("names", "geneNames", "eValues", "fastaHeaders"):
+                    if field in obj:
+                        obj[field] = obj[field][:top_k]
+    else:
+        tax_set = materialize_sorted_hits(tax_set, hits, top_k)
+
+    dataset = {"lns": lns, "taxSet": tax_set, "eValueEnabled": e_value_enabled, "fastaEnabled": fasta_enabled, "rankPatternFull": ALLOWED_RANKS}
+    if top_k > 0:
+        dataset["hitTopK"] = top_k
+    return dataset
+
+async def process_tsv_session(file) -> Response:
+    """
+    Process an upload into a server-side dataset and return its ID with the root level of the tree.
+
+    The rest is fetched on demand: /datasets/{id}/children for deeper levels and
+    /datasets/{id}/hits for one taxon's hits, page by page.
+    """
+    started = time.perf_counter()
+    path, digest = await spool_upload(file)
+    server_stages = {"upload": time.perf_counter() - started}
+    try:
+        input_bytes.observe(path.stat().st_size, pipeline="tsv")
+        session_id, stored = await run_in_threadpool(prepare_tsv_session, digest)
+
+        worker_stages: Dict[str, float] = {}
+        if not stored:
+            submitted = time.perf_counter()
+            report = await dataset_executor.run(write_tsv_session, str(path), session_id)
+            server_stages["queue"] = max(0.0, time.perf_counter() - submitted - report["seconds"])
+            record_report("tsv", report)
+            worker_stages = report["stages"]
+
+        body = encode_json(await run_in_threadpool(session_store.overview, session_id))
+        return finish_timed(Response(body, media_type="application/json"), "tsv", started, server_stages, worker_stages)
+    finally:
+        path.unlink(missing_ok=True)
+
+def prepare_tsv_session(digest: str) -> Tuple[str, bool]:
+    """Sweep expired sessions, then return the upload's dataset ID and whether it is already stored."""
+    # Blocking (taxonomy version, disk), so it runs in the threadpool, not on the event loop.
+    session_store.sweep()
+    session_id = session_store.key(digest)
+    return session_id, session_store.contains(session_id)
+
+def write_tsv_session(path: str, session_id: str) -> Dict[str, Any]:
+    timer = StageTimer()
+    dataset = build_tsv_dataset_from_path(path, timer)
+    timer("storing session")
+    session_store.write(session_id, dataset)
+    return timer.report()
+
+async def fetch_dataset_children(dataset_id: str, taxon: str) -> Dict[str, Any]:
+    return await run_in_threadpool(session_store.children, dataset_id, taxon)
+
+async def fetch_dataset_hits(dataset_id: str, taxon: str, offset: int, limit: int) -> Dict[str, Any]:
+    return await run_in_threadpool(session_store.hits, dataset_id, taxon, offset, limit)
+
+async def fetch_dataset_rank(dataset_id: str, rank: str, limit: int, min_count: int, sort_by: str) -> Response:
+    table = await run_in_threadpool(session_store.rank_table, dataset_id, rank, limit, min_count, sort_by)
+    # Dataset IDs are content-addressed, so the answer for a given URL never changes.
+    headers = {"Cache-Control": f"private, max-age={SESSION_TTL_SECONDS}, immutable"}
+    return Response(encode_json(table), media_type="application/json", headers=headers)
+
+async def process_faa_dataset(file, include_sequences: bool = True):
+    started = time.perf_counter()
+    path, digest = await spool_upload(file)
+    server_stages = {"upload": time.perf_counter() - started}
+    try:
+        input_bytes.observe(path.stat().st_size, pipeline="faa")
+        await run_in_threadpool(fasta_store.sweep)
+
+        submitted = time.perf_counter()
+        body, report = await dataset_executor.run(render_faa_dataset, str(path), digest, include_sequences)
+        server_stages["queue"] = max(0.0, time.perf_counter() - submitted - report["seconds"])
+        record_report("faa", report)
+
+        return finish_timed(Response(body, media_type="application/json"), "faa", started, server_stages, report["stages"])
+    finally:
+        path.unlink(missing_ok=True)
+
+def render_faa_dataset(path: str, store_id: str, include_sequences: bool = True) -> Tuple[bytes, Dict[str, Any]]:
+    timer = StageTimer()
+    with open_upload(path) as stream:
+        dataset = build_faa_dataset(stream, store_id, include_sequences, timer)
+    timer("serializing")
+    body = encode_json(dataset)
+    return body, timer.report()
+
+def build_faa_dataset(
+    stream: BinaryIO,
+    store_id: str,
+    include_sequences: bool = True,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    # The upload is indexed on disk, so clients can skip `faaObj` and fetch single sequences later.
+    if progress is not None:
+        progress("indexing sequences")
+    if fasta_store.contains(store_id):
+        sequence_count = fasta_store.count(store_id)
+    else:
+        sequence_count = fasta_store.write(store_id, iter_fasta_records(iter_lines(stream)))
+
+    dataset: Dict[str, Any] = {}
+    if include_sequences:
+        if progress is not None:
+            progress("reading sequences", sequences=sequence_count)
+        dataset["faaObj"] = fasta_store.read_all(store_id)
+    elif progress is not None:
+        progress("indexing sequences", sequences=sequence_count)
+    dataset["faaStoreId"] = store_id
+    dataset["sequenceCount"] = sequence_count
+    return dataset
 
-async def process_tsv_dataset(file):
-    file = await file.read()
-    file_lines = (file.decode("utf-8")[:-1]).split("\n")
-    header_line = file_lines[0]
-    lines = file_lines[1:]
-    
-    raw_tax_set, raw_lns, e_value_enabled, fasta_enabled = build_raw_taxon_index(header_line, lines)
-    tax_set, lns = build_rank_filtered_taxon_set(raw_tax_set, raw_lns, e_value_enabled, fasta_enabled)
-    lns = dedupe_and_sort_lineages(lns)
-    tax_set = propagate_counts_and_build_children(lns, tax_set)
-    tax_set = sort_hits_by_evalue(tax_set)
-
-    return {"lns": lns, "taxSet": tax_set, "eValueEnabled": e_value_enabled, "fastaEnabled": fasta_enabled, "rankPatternFull": ALLOWED_RANKS}
-
-async def process_faa_dataset(file):
-    file = await file.read()
-    fasta_file = (file.decode("utf-8")[:-1]).split(">")
-    
-    seq_dict = {}
-    for seq in fasta_file:
-        seq2list = seq.split("\n")
-        if len(seq2list) > 1:
-            seq_name = seq2list[0]
-            seq_body = seq2list[1].replace("*", "")
-            seq_dict[seq_name] = seq_body
-
-    return {"faaObj": seq_dict}
\ No newline at end of file
+async def fetch_faa_sequences(store_id: str, headers: List[str]) -> Dict[str, Any]:
+    sequences, missing = await run_in_threadpool(fasta_store.fetch, store_id, headers)
+    return {"sequences": sequences, "missing": missing}
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from app.core.config import FASTA_STORE_DIR, FASTA_STORE_TTL_SECONDS
+from app.services.content_store import ContentStore
+
+SEQUENCES_FILE = "sequences.bin"
+INDEX_FILE = "index.tsv"
+
+# header -> (byte offset, byte length) in the sequences file
+FastaIndex = Dict[str, Tuple[int, int]]
+
+
+@lru_cache(maxsize=16)
+def _load_index(index_path: str, mtime_ns: int) -> FastaIndex:
+    index: FastaIndex = {}
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            header, offset, length = line.rstrip("\n").rsplit("\t", 2)
+            index[header] = (int(offset), int(length))
+    return index
+
+
+class FastaStore(ContentStore):
+    """
+    On-disk, indexed store of uploaded protein FASTA files.
+
+    Layout: <root>/<upload SHA-256>/
+      sequences.bin  unwrapped sequences ("*" removed), concatenated, one per record
+      index.tsv      header<TAB>offset<TAB>length per line, in the spirit of a samtools .fai
+
+    Stores are content-addressed, so uploading the same file twice reuses its store. A header
+    that occurs several times resolves to its last record, like the `faaObj` response does.
+    """
+
+    kind = "FASTA store"
+    marker_file = INDEX_FILE
+    _load = staticmethod(_load_index)
+
+    def write(self, store_id: str, records: Iterable[Tuple[str, str]]) -> int:
+        """Stream (header, sequence) records into a new store; returns the number of distinct headers."""
+        return self._write(store_id, lambda tmp_dir: _write_records(tmp_dir, records))
+
+    def count(self, store_id: str) -> int:
+        return len(self._open(store_id)[1])
+
+    def read_all(self, store_id: str) -> Dict[str, str]:
+        """Every header -> sequence of a store, in first-appearance order."""
+        store_dir, index = self._open(store_id)
+        with open(store_dir / SEQUENCES_FILE, "rb") as f:
+            data = f.read()
+        return {header: data[start : start + length].decode("utf-8") for header, (start, length) in index.items()}
+
+    def fetch(self, store_id: str, headers: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """Sequences for `headers`, read by offset; also returns the headers that are not in the store."""
+        store_dir, index = self._open(store_id)
+        found: Dict[str, str] = {}
+        missing: List[str] = []
+        with open(store_dir / SEQUENCES_FILE, "rb") as f:
+            for header in headers:
+                entry = index.get(header)
+                if entry is None:
+                    missing.append(header)
+                    continue
+                f.seek(entry[0])
+                found[header] = f.read(entry[1]).decode("utf-8")
+        return found, missing
+
+
+def _write_records(store_dir: Path, records: Iterable[Tuple[str, str]]) -> int:
+    index: FastaIndex = {}
+    offset = 0
+    with open(store_dir / SEQUENCES_FILE, "wb") as f:
+        for header, sequence in records:
+            encoded = sequence.encode("utf-8")
+            f.write(encoded)
+            index[header] = (offset, len(encoded))
+            offset += len(encoded)
+
+    # The index is written last: its presence marks a complete store.
+    with open(store_dir / INDEX_FILE, "w", encoding="utf-8") as f:
+        for header, (start, length) in index.items():
+            f.write(f"{header}\t{start}\t{length}\n")
+    return len(index)
+
+
+fasta_store = FastaStore(Path(FASTA_STORE_DIR), FASTA_STORE_TTL_SECONDS)
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Set
+
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import JOB_DIR, JOB_TTL_SECONDS
+from app.core.executor import dataset_executor
+from app.core.metrics import input_bytes, record_report, result_cache_requests
+from app.services.dataset_service import render_tsv_dataset, spool_upload
+from app.services.result_cache import result_cache
+from app.utils.serialization import RESPONSE_FORMATS
+
+STATUS_FILE = "status.json"
+RESULT_FILE = "result.body"
+
+# Jobs that never finished (e.g. their server worker died) are swept after this long.
+STALE_JOB_SECONDS = 24 * 3600
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+# Keep references to running jobs so they are not garbage-collected mid-flight.
+_background_jobs: Set[asyncio.Task] = set()
+
+
+def _job_dir(job_id: str) -> Path:
+    return Path(JOB_DIR) / job_id
+
+
+def _read_status(job_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((job_dir / STATUS_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _update_status(job_dir: Path, **fields: Any) -> Dict[str, Any]:
+    """Merge `fields` into the job's status file (atomic replace, readable by every worker)."""
+    status = _read_status(job_dir) or {}
+    status.update(fields)
+    status["updatedAt"] = time.time()
+
+    tmp = job_dir / f".{STATUS_FILE}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(status))
+    tmp.replace(job_dir / STATUS_FILE)
+    return status
+
+
+class JobProgress:
+    """
+    Progress callback for the dataset pipeline that records the current stage in the job's status file.
+
+    Picklable, so it can be handed to a pool process. Writes are throttled to one per
+    `min_interval` seconds, except that a stage change is always written.
+    """
+
+    def __init__(self, job_dir: str, min_interval: float = 0.5) -> None:
+        self.job_dir = job_dir
+        self.min_interval = min_interval
+        self.state: Dict[str, Any] = {}
+        self._last_write = 0.0
+
+    def __call__(self, stage: str, **counters: Any) -> None:
+        stage_changed = stage != self.state.get("stage")
+        self.state["stage"] = stage
+        self.state.update(counters)
+
+        now = time.monotonic()
+        if stage_changed or now - self._last_write >= self.min_interval:
+            _update_status(Path(self.job_dir), status="running", **self.state)
+            self._last_write = now
+
+
+def write_tsv_job_result(upload_path: str, job_dir: str, response_format: str, top_k: int = 0) -> Dict[str, Any]:
+    """Pool-side job body: process the upload and write the rendered result next to the job status."""
+    body, report = render_tsv_dataset(upload_path, JobProgress(job_dir), response_format, top_k)
+
+    result = Path(job_dir) / RESULT_FILE
+    tmp = result.with_name(f".{RESULT_FILE}.tmp")
+    tmp.write_bytes(body)
+    tmp.replace(result)
+    return report
+
+
+def sweep_expired_jobs() -> None:
+    """Delete finished jobs older than JOB_TTL_SECONDS and unfinished ones older than STALE_JOB_SECONDS."""
+    root = Path(JOB_DIR)
+    if not root.is_dir():
+        return
+
+    now = time.time()
+    for job_dir in root.iterdir():
+        status = _read_status(job_dir)
+        if status is None:
+            # Status not written yet (job being created) or unreadable: fall back to the directory age.
+            age = now - job_dir.stat().st_mtime
+            finished = False
+        else:
+            age = now - status.get("updatedAt", 0)
+            finished = status.get("status") in ("done", "failed")
+
+        if age > (JOB_TTL_SECONDS if finished else STALE_JOB_SECONDS):
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+async def submit_tsv_job(file, response_format: str = "json", top_k: int = 0) -> JSONResponse:
+    """
+    Accept an upload for background processing and return its job ID right away.
+
+    The job's executor slot is reserved here, so an accepted job waits for a pool process
+    instead of failing as busy; it is released when the job is over.
+    """
+    dataset_executor.reserve()
+    try:
+        await run_in_threadpool(sweep_expired_jobs)
+
+        path, digest = await spool_upload(file)
+        input_bytes.observe(path.stat().st_size, pipeline="tsv")
+
+        job_id = uuid.uuid4().hex
+        job_dir = _job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        status = _update_status(
+            job_dir,
+            jobId=job_id,
+            status="queued",
+            stage=None,
+            linesParsed=0,
+            taxaResolved=0,
+            format=response_format,
+            createdAt=time.time(),
+        )
+    except BaseException:
+        dataset_executor.release()
+        raise
+
+    task = asyncio.create_task(_run_tsv_job(job_dir, path, digest, response_format, top_k))
+    _background_jobs.add(task)
+    task.add_done_callback(_background_jobs.discard)
+
+    return JSONResponse(
+        status_code=202,
+        content={**status, "statusUrl": f"/jobs/{job_id}", "resultUrl": f"/jobs/{job_id}/result"},
+    )
+
+
+def _copy_cached(cached: BinaryIO, result: Path) -> None:
+    with cached, open(result, "wb") as f:
+        shutil.copyfileobj(cached, f)
+
+
+async def _run_tsv_job(job_dir: Path, upload_path: Path, digest: str, response_format: str, top_k: int) -> None:
+    result = job_dir / RESULT_FILE
+    try:
+        cache_key = result_cache.key(digest, response_format, top_k) if result_cache.enabled else None
+        cached = await run_in_threadpool(result_cache.get, cache_key) if cache_key else None
+
+        if result_cache.enabled:
+            result_cache_requests.inc(result="miss" if cached is None else "hit")
+
+        if cached is not None:
+            await run_in_threadpool(_copy_cached, cached, result)
+        else:
+            report = await dataset_executor.run_reserved(write_tsv_job_result, str(upload_path), str(job_dir), response_format, top_k)
+            record_report("tsv", report)
+            if cache_key is not None:
+                await run_in_threadpool(result_cache.put_file, cache_key, result)
+
+        _update_status(job_dir, status="done", stage=None, resultBytes=result.stat().st_size)
+    except Exception as exc:
+        error = exc.detail if isinstance(exc, HTTPException) else f"{type(exc).__name__}: {exc}"
+        _update_status(job_dir, status="failed", error=error)
+    finally:
+        dataset_executor.release()
+        upload_path.unlink(missing_ok=True)
+
+
+def get_job_status(job_id: str) -> Dict[str, Any]:
+    status = _read_status(_job_dir(job_id)) if _JOB_ID.fullmatch(job_id) else None
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    return status
+
+
+def get_job_result(job_id: str):
+    status = get_job_status(job_id)
+
+    if status["status"] == "failed":
+        raise HTTPException(status_code=500, detail=status.get("error", "Job failed"))
+    if status["status"] != "done":
+        return JSONResponse(status_code=202, content=status)
+
+    media_type = RESPONSE_FORMATS[status.get("format", "json")]
+    return FileResponse(_job_dir(job_id) / RESULT_FILE, media_type=media_type)
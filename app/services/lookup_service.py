@@ -1,7 +1,53 @@
-import taxopy
-from app.core.taxdb import get_taxdb
+from typing import Dict, List
+
+from fastapi import HTTPException
+
+from app.core.taxdb import get_taxdb, taxonomy_warmup
+
+def _loaded_taxdb():
+    # Answer right away while the start-up warm-up is loading the taxonomy, instead of
+    # holding a server thread until it is done; /ready tells clients when to come back.
+    if taxonomy_warmup.loading:
+        raise HTTPException(status_code=503, detail="The taxonomy is still loading, please retry shortly.", headers={"Retry-After": "10"})
+    return get_taxdb()
 
 def resolve_id_by_name(taxon_name):
-    taxdb = get_taxdb()
-    taxid = taxopy.taxid_from_name(taxon_name, taxdb)
-    return {"taxID": taxid[0]}
\ No newline at end of file
+    taxdb = _loaded_taxdb()
+    taxid = taxdb.taxids_by_name(taxon_name)
+    if not taxid:
+        raise HTTPException(status_code=404, detail=f"Unknown taxon name: {taxon_name}")
+    return {"taxID": taxid[0]}
+
+def resolve_ids_by_names(taxon_names: List[str], ignore_case: bool = False) -> Dict[str, Dict[str, List[int]]]:
+    # Every matching taxID per name (homonyms included); unknown names map to an empty list.
+    taxdb = _loaded_taxdb()
+    return {"taxIDs": {name: taxdb.taxids_by_name(name, ignore_case) for name in taxon_names}}
+
+def search_taxa_by_name(prefix: str, limit: int):
+    taxdb = _loaded_taxdb()
+    matches = taxdb.search_names(prefix, limit)
+    return {"matches": [{"name": name, "taxID": taxid, "rank": taxdb.rank_of(taxid)} for name, taxid in matches]}
+
+def _known_taxdb(taxids: List[int]):
+    taxdb = _loaded_taxdb()
+    for taxid in taxids:
+        if taxid not in taxdb:
+            raise HTTPException(status_code=404, detail=f"Unknown taxID: {taxid}")
+    return taxdb
+
+def check_ancestry(ancestor: int, taxids: List[int]):
+    # One interval comparison per taxID; unknown taxIDs are reported as not under `ancestor`.
+    taxdb = _known_taxdb([ancestor])
+    return {"ancestor": ancestor, "isAncestor": taxdb.in_subtree(ancestor, taxids).tolist()}
+
+def list_subtree(taxid: int, limit: int):
+    taxdb = _known_taxdb([taxid])
+    subtree = taxdb.subtree(taxid)
+    return {"taxID": taxid, "size": len(subtree), "taxIDs": subtree[:limit].tolist()}
+
+def sum_subtree_counts(taxids: List[int], counts: List[float], ancestors: List[int]):
+    if len(taxids) != len(counts):
+        raise HTTPException(status_code=422, detail="taxIDs and counts must have the same length")
+    taxdb = _known_taxdb(list(set(taxids) | set(ancestors)))
+    totals = taxdb.subtree_totals(taxids, counts, ancestors).tolist()
+    return {"totals": {str(ancestor): total for ancestor, total in zip(ancestors, totals)}}
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Set
+
+from app.core.config import ALLOWED_RANKS, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+from app.core.taxdb import get_taxdb
+
+# Bump when the shape of the /load_tsv_data response changes, so old entries stop matching.
+RESULT_FORMAT_VERSION = 1
+
+
+class ResultCache:
+    """
+    Size-bounded, content-addressed disk cache of rendered dataset responses.
+
+    Layout: <root>/<taxonomy index version>/<key>.body
+
+    Entries live under the version of the taxonomy index they were computed with. When this
+    process switches to a new version, directories of versions older than the one it leaves
+    are removed: the previous version stays, since other workers may still be serving from it
+    until they switch too. Eviction is LRU by file mtime, which is refreshed on every hit.
+    Writes go through a temporary file and an atomic rename, so concurrent workers never read
+    partial entries, and hits are served from an open file, so eviction never breaks them.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        # Taxonomy version this process last used the cache with.
+        self._version: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, upload_digest: str, response_format: str = "json", top_k: int = 0) -> str:
+        """Cache key for an upload, covering everything else the response depends on."""
+        parts = [upload_digest, response_format, json.dumps(ALLOWED_RANKS), str(RESULT_FORMAT_VERSION)]
+        if top_k > 0:
+            parts.append(f"top{top_k}")
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _version_dir(self) -> Path:
+        version = get_taxdb().version
+        if version != self._version:
+            previous, self._version = self._version, version
+            if previous is not None:
+                self._drop_versions(keep={version, previous})
+        return self.root / version
+
+    def get(self, key: str) -> Optional[BinaryIO]:
+        """
+        The cached body, opened for reading; the caller closes it. An open entry stays readable
+        when another worker's eviction unlinks it meanwhile, so a hit can never turn into a
+        missing file later on. An entry that is already gone is a miss.
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            f = open(self._version_dir() / f"{key}.body", "rb")
+        except FileNotFoundError:
+            return None
+        os.utime(f.fileno())
+        return f
+
+    def put(self, key: str, body: bytes) -> None:
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        self._store(key, lambda tmp: tmp.write_bytes(body))
+
+    def put_file(self, key: str, src: Path) -> None:
+        """Store an already rendered response file (copied, `src` is left in place)."""
+        if not self.enabled or src.stat().st_size > self.max_bytes:
+            return
+        self._store(key, lambda tmp: shutil.copyfile(src, tmp))
+
+    def _store(self, key: str, write: Callable[[Path], object]) -> None:
+        version_dir = self._version_dir()
+        version_dir.mkdir(parents=True, exist_ok=True)
+
+        tmp = version_dir / f".{key}.{os.getpid()}.tmp"
+        write(tmp)
+        tmp.replace(version_dir / f"{key}.body")
+
+        self._evict(version_dir)
+
+    def _drop_versions(self, keep: Set[str]) -> None:
+        if not self.root.is_dir():
+            return
+        for entry in self.root.iterdir():
+            if entry.is_dir() and entry.name not in keep:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def _evict(self, version_dir: Path) -> None:
+        entries = []
+        for entry in os.scandir(version_dir):
+            if entry.name.endswith(".body"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            total -= size
+
+
+result_cache = ResultCache(Path(RESULT_CACHE_DIR), RESULT_CACHE_MAX_BYTES)
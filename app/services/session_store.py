@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.core.config import ALLOWED_RANKS, SESSION_DIR, SESSION_TTL_SECONDS
+from app.core.taxdb import get_taxdb
+from app.services.content_store import ContentStore
+from app.utils.ranks import build_rank_tables, rank_rows
+
+# Bump when the session layout changes, so sessions written by older code are not reused.
+SESSION_FORMAT_VERSION = 2
+
+TREE_FILE = "tree.json"
+E_VALUES_FILE = "eValues.npy"
+
+# Per-hit string columns, stored as <column>.bin (UTF-8, concatenated) plus <column>.offsets.npy.
+STRING_COLUMNS = ("names", "geneNames", "fastaHeaders")
+
+def _taxon_key(node: List[str]) -> str:
+    return f"{node[1]} {node[0]}"
+
+
+def build_session_tree(dataset: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Hit-free summary of a /load_tsv_data result, as served level by level, plus the
+    per-rank tables of `build_rank_tables`.
+
+    Direct children are taken from the lineages rather than from `directChildren`,
+    which the response leaves empty for the root.
+    """
+    direct_children: Dict[str, Dict[str, None]] = {}
+    for ln in dataset["lns"]:
+        for parent, child in zip(ln, ln[1:]):
+            direct_children.setdefault(_taxon_key(parent), {})[_taxon_key(child)] = None
+
+    taxa: Dict[str, Dict[str, Any]] = {}
+    hit_start = 0
+    for key, obj in dataset["taxSet"].items():
+        hit_count = len(obj["names"])
+        taxa[key] = {
+            "key": key,
+            "name": obj["name"],
+            "rank": obj["rank"],
+            "taxID": obj["taxID"],
+            "rawCount": obj["rawCount"],
+            "unaCount": obj["unaCount"],
+            "totCount": obj["totCount"],
+            "lnIndex": obj["lnIndex"],
+            "hitCount": hit_count,
+            "hitStart": hit_start,
+            "directChildren": list(direct_children.get(key, ())),
+        }
+        hit_start += hit_count
+
+    return {
+        "eValueEnabled": dataset["eValueEnabled"],
+        "fastaEnabled": dataset["fastaEnabled"],
+        "rankPatternFull": dataset["rankPatternFull"],
+        "taxa": taxa,
+        "ranks": build_rank_tables(dataset["taxSet"], dataset["rankPatternFull"]),
+    }
+
+
+def node_summary(node: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {k: v for k, v in node.items() if k not in ("hitStart", "directChildren")}
+    summary["childCount"] = len(node["directChildren"])
+    return summary
+
+
+@lru_cache(maxsize=8)
+def _load_tree(tree_path: str, mtime_ns: int) -> Dict[str, Any]:
+    with open(tree_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class SessionStore(ContentStore):
+    """
+    Processed TSV datasets kept on disk, so clients can fetch the tree level by level and
+    the hits of one taxon at a time instead of the whole /load_tsv_data response.
+
+    Layout: <root>/<dataset ID>/
+      tree.json                        per-taxon counts, direct children and hit range; per-rank tables
+      eValues.npy                      hit e-values (if the input has them)
+      <column>.bin, <column>.offsets.npy  per-hit string columns (names, geneNames, fastaHeaders)
+
+    Hits are stored taxon by taxon in taxSet order, each taxon's hits already sorted by
+    e-value, so a page of hits is one contiguous slice of every column. Like the FASTA store,
+    sessions are content-addressed and removed after `ttl_seconds` without use.
+    """
+
+    kind = "dataset"
+    marker_file = TREE_FILE
+    _load = staticmethod(_load_tree)
+
+    def key(self, upload_digest: str) -> str:
+        """Dataset ID of an upload; a new taxonomy release gives the same upload a new ID."""
+        parts = [upload_digest, get_taxdb().version, json.dumps(ALLOWED_RANKS), str(SESSION_FORMAT_VERSION)]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def write(self, session_id: str, dataset: Dict[str, Any]) -> None:
+        self._write(session_id, lambda tmp_dir: _write_session(tmp_dir, dataset))
+
+    @staticmethod
+    def _node(tree: Dict[str, Any], taxon: str) -> Dict[str, Any]:
+        node = tree["taxa"].get(taxon)
+        if node is None:
+            raise HTTPException(status_code=404, detail=f"Unknown taxon: {taxon}")
+        return node
+
+    def overview(self, session_id: str) -> Dict[str, Any]:
+        """Dataset flags plus the root taxon and its direct children."""
+        _, tree = self._open(session_id)
+        return {
+            "datasetId": session_id,
+            "eValueEnabled": tree["eValueEnabled"],
+            "fastaEnabled": tree["fastaEnabled"],
+            "rankPatternFull": tree["rankPatternFull"],
+            "taxaCount": len(tree["taxa"]),
+            **self.children(session_id, "root root"),
+        }
+
+    def children(self, session_id: str, taxon: str) -> Dict[str, Any]:
+        _, tree = self._open(session_id)
+        node = self._node(tree, taxon)
+        return {
+            "taxon": node_summary(node),
+            "children": [node_summary(tree["taxa"][child]) for child in node["directChildren"]],
+        }
+
+    def rank_table(self, session_id: str, rank: str, limit: int, min_count: int = 0, sort_by: str = "totCount") -> Dict[str, Any]:
+        """Top `limit` taxa of one rank, see `rank_rows`."""
+        _, tree = self._open(session_id)
+        keys = tree["ranks"].get(rank)
+        if keys is None:
+            raise HTTPException(status_code=404, detail=f"Unknown rank: {rank}")
+        return {"rank": rank, "taxaCount": len(keys), "taxa": rank_rows(tree["taxa"], keys, limit, min_count, sort_by)}
+
+    def hits(self, session_id: str, taxon: str, offset: int, limit: int) -> Dict[str, Any]:
+        """One page of a taxon's hits, in e-value order (input order without e-values)."""
+        session_dir, tree = self._open(session_id)
+        node = self._node(tree, taxon)
+
+        total = node["hitCount"]
+        first = node["hitStart"] + min(offset, total)
+        last = node["hitStart"] + min(offset + limit, total)
+
+        page: Dict[str, Any] = {"taxon": taxon, "total": total, "offset": offset, "limit": limit}
+        page["names"] = _read_strings(session_dir, "names", first, last)
+        page["geneNames"] = _read_strings(session_dir, "geneNames", first, last)
+        if tree["eValueEnabled"]:
+            page["eValues"] = np.load(session_dir / E_VALUES_FILE, mmap_mode="r")[first:last].tolist()
+        if tree["fastaEnabled"]:
+            page["fastaHeaders"] = [h or None for h in _read_strings(session_dir, "fastaHeaders", first, last)]
+        return page
+
+
+def _write_session(session_dir: Path, dataset: Dict[str, Any]) -> None:
+    tax_set = dataset["taxSet"]
+    for column in STRING_COLUMNS:
+        if column == "fastaHeaders" and not dataset["fastaEnabled"]:
+            continue
+        offsets = array("q", [0])
+        with open(session_dir / f"{column}.bin", "wb") as f:
+            for obj in tax_set.values():
+                for value in _column(obj, column, ""):
+                    f.write((value or "").encode("utf-8"))
+                    offsets.append(f.tell())
+        np.save(session_dir / f"{column}.offsets.npy", np.frombuffer(offsets, dtype=np.int64))
+
+    if dataset["eValueEnabled"]:
+        e_values = [e for obj in tax_set.values() for e in _column(obj, "eValues", float("nan"))]
+        np.save(session_dir / E_VALUES_FILE, np.asarray(e_values, dtype=np.float64))
+
+    # The tree is written last: its presence marks a complete session.
+    with open(session_dir / TREE_FILE, "w", encoding="utf-8") as f:
+        json.dump(build_session_tree(dataset), f, ensure_ascii=False, separators=(",", ":"))
+
+
+def _column(obj: Dict[str, Any], column: str, missing: Any) -> List[Any]:
+    # Every column needs one value per hit, also for taxa that lack the field.
+    values = obj.get(column)
+    return values if values is not None else [missing] * len(obj["names"])
+
+
+def _read_strings(session_dir: Path, column: str, first: int, last: int) -> List[str]:
+    offsets = np.load(session_dir / f"{column}.offsets.npy", mmap_mode="r")[first : last + 1].tolist()
+    if len(offsets) < 2:
+        return []
+    with open(session_dir / f"{column}.bin", "rb") as f:
+        f.seek(offsets[0])
+        data = f.read(offsets[-1] - offsets[0])
+    base = offsets[0]
+    return [data[a - base : b - base].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+
+session_store = SessionStore(Path(SESSION_DIR), SESSION_TTL_SECONDS)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from app.utils.hits import HitTable
+
+TaxonKey = str
+TaxonSet = Dict[TaxonKey, Dict[str, Any]]
+
+
+def sample_count_matrices(
+    tax_set: TaxonSet,
+    hits: HitTable,
+    sample_of_row: np.ndarray,
+    n_samples: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-sample unaCount and totCount of every taxon of a merged tree, as (taxa x samples) int64 matrices.
+
+    Rows follow tax_set order. `tax_set` must still list its hits' taxon codes under "hits"
+    (i.e. come straight from the tree builder). Counts are linear in the hits, so the merged
+    tree's own propagation is reused: a taxon's unaCount is the number of hits of its codes,
+    and its totCount adds the unaCount of every entry of its "children" list. Summed over the
+    samples, both equal the tree's unaCount/totCount.
+    """
+    hits.freeze()
+    n_codes = len(hits.taxon_keys)
+    flat = hits.taxon_codes.astype(np.int64) * n_samples + sample_of_row
+    code_counts = np.bincount(flat, minlength=n_codes * n_samples).reshape(n_codes, n_samples)
+
+    row_of = {key: i for i, key in enumerate(tax_set)}
+    una = np.zeros((len(tax_set), n_samples), dtype=np.int64)
+    for i, obj in enumerate(tax_set.values()):
+        una[i] = code_counts[obj["hits"]].sum(axis=0)
+
+    tot = una.copy()
+    for i, obj in enumerate(tax_set.values()):
+        if obj["children"]:
+            tot[i] += una[[row_of[child] for child in obj["children"]]].sum(axis=0)
+    return una, tot
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator, List, Tuple
+
+
+def iter_fasta_records(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Lazily yield (header, sequence) pairs from FASTA lines.
+
+    - the header is everything after ">" on the header line
+    - wrapped sequences are joined across all of their lines
+    - stop codons ("*") are removed from the sequence
+    - lines before the first header are ignored
+    """
+    header = None
+    parts: List[str] = []
+
+    for line in lines:
+        if line.startswith(">"):
+            if header is not None:
+                yield header, "".join(parts).replace("*", "")
+            header = line[1:]
+            parts = []
+        elif header is not None:
+            parts.append(line.strip())
+
+    if header is not None:
+        yield header, "".join(parts).replace("*", "")
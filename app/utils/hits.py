@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+TaxonKey = str
+
+
+class StringColumn:
+    """
+    Append-only column of strings packed into a single UTF-8 buffer.
+
+    Row i lives at buffer[offsets[i]:offsets[i + 1]], so a column of N strings costs
+    one bytearray plus N int64 offsets instead of N Python str objects.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def append(self, value: str) -> None:
+        self._buffer += value.encode("utf-8")
+        self._offsets.append(len(self._buffer))
+
+    @classmethod
+    def concat(cls, columns: Sequence["StringColumn"]) -> "StringColumn":
+        """One column holding the rows of `columns`, in order."""
+        merged = cls()
+        for column in columns:
+            base = len(merged._buffer)
+            merged._buffer += column._buffer
+            offsets = np.frombuffer(column._offsets, dtype=np.int64)[1:] + base
+            merged._offsets.frombytes(offsets.tobytes())
+        return merged
+
+    def __getitem__(self, row: int) -> str:
+        return self._buffer[self._offsets[row] : self._offsets[row + 1]].decode("utf-8")
+
+    def take(self, rows: Sequence[int]) -> List[str]:
+        buffer, offsets = self._buffer, self._offsets
+        return [buffer[offsets[r] : offsets[r + 1]].decode("utf-8") for r in rows]
+
+
+class HitTable:
+    """
+    Columnar storage for parsed hits: one row per input line.
+
+    Columns:
+      taxon_codes:   small integer code of the taxon the hit was assigned to (see `taxon_keys`)
+      gene_names:    packed string column
+      e_values:      float64 values (only if the input has e-values)
+      fasta_headers: packed string column, "" meaning "no header" (only if the input has headers)
+
+    Rows are appended while parsing; `freeze()` converts the numeric columns to NumPy
+    and groups rows by taxon, after which `rows(codes)` returns the row indices of the
+    given taxa as concatenated index ranges.
+    """
+
+    def __init__(self, has_evalues: bool, has_fasta_headers: bool) -> None:
+        self.has_evalues = has_evalues
+        self.has_fasta_headers = has_fasta_headers
+
+        self.taxon_keys: List[TaxonKey] = []
+        self._codes_by_key: Dict[TaxonKey, int] = {}
+
+        self.taxon_codes = array("i")
+        self.gene_names = StringColumn()
+        self.e_values = array("d") if has_evalues else None
+        self.fasta_headers: Optional[StringColumn] = StringColumn() if has_fasta_headers else None
+
+        self._order: Optional[np.ndarray] = None
+        self._starts: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.taxon_codes)
+
+    def taxon_code(self, key: TaxonKey) -> int:
+        """Return the code for `key`, registering it on first use."""
+        code = self._codes_by_key.get(key)
+        if code is None:
+            code = len(self.taxon_keys)
+            self._codes_by_key[key] = code
+            self.taxon_keys.append(key)
+        return code
+
+    def append(self, code: int, gene_name: str, e_value: float, fasta_header: str) -> None:
+        self.taxon_codes.append(code)
+        self.gene_names.append(gene_name)
+        if self.e_values is not None:
+            self.e_values.append(e_value)
+        if self.fasta_headers is not None:
+            self.fasta_headers.append(fasta_header)
+
+    @classmethod
+    def concat(
+        cls,
+        tables: Sequence["HitTable"],
+        code_maps: Sequence[Sequence[int]],
+        has_evalues: bool,
+        has_fasta_headers: bool,
+    ) -> "HitTable":
+        """
+        Rows of `tables` (parsed shards, in input order) in one table; the rows of tables[i]
+        are re-tagged from code c to code_maps[i][c]. Taxon keys are not carried over.
+        """
+        merged = cls(has_evalues, has_fasta_headers)
+        codes = [np.asarray(code_map, dtype=np.int32)[np.asarray(table.taxon_codes, dtype=np.int32)] for table, code_map in zip(tables, code_maps)]
+        merged.taxon_codes = np.concatenate(codes) if codes else np.empty(0, dtype=np.int32)
+        merged.gene_names = StringColumn.concat([table.gene_names for table in tables])
+        if has_evalues:
+            merged.e_values = np.concatenate([np.asarray(table.e_values, dtype=np.float64) for table in tables]) if tables else np.empty(0)
+        if has_fasta_headers:
+            merged.fasta_headers = StringColumn.concat([table.fasta_headers for table in tables])
+        return merged
+
+    def recode(self, mapping: Sequence[int]) -> None:
+        """
+        Translate the codes rows were appended with into taxon codes.
+
+        Lets the parser tag rows with a cheap provisional code (e.g. per distinct taxID)
+        and map them to taxon codes once all lineages are known. Row code c becomes mapping[c].
+        """
+        codes = np.asarray(self.taxon_codes, dtype=np.int32)
+        self.taxon_codes = np.asarray(mapping, dtype=np.int32)[codes]
+
+    def freeze(self) -> "HitTable":
+        """Switch numeric columns to NumPy and group row indices by taxon code."""
+        if self._order is not None:
+            return self
+
+        self.taxon_codes = np.asarray(self.taxon_codes, dtype=np.int32)
+        if self.e_values is not None:
+            self.e_values = np.asarray(self.e_values, dtype=np.float64)
+
+        # Stable sort keeps input order within each taxon.
+        self._order = np.argsort(self.taxon_codes, kind="stable")
+        counts = np.bincount(self.taxon_codes, minlength=len(self.taxon_keys))
+        self._starts = np.concatenate(([0], np.cumsum(counts)))
+        return self
+
+    def rows(self, codes: Sequence[int]) -> np.ndarray:
+        """Row indices of all hits of the given taxa, taxon by taxon, each in input order."""
+        self.freeze()
+        order, starts = self._order, self._starts
+        ranges = [order[starts[c] : starts[c + 1]] for c in codes]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(ranges)
+
+
+def materialize_hits(tax_set: Dict[TaxonKey, dict], hits: HitTable) -> Dict[TaxonKey, dict]:
+    """
+    Replace each taxon's "hits" reference list with the per-hit lists of the response.
+
+    Fills, in input order of the referenced taxa:
+      - names        (key of the taxon each hit was originally assigned to)
+      - geneNames
+      - eValues      (if the entry carries that field; empty if the input has no e-values)
+      - fastaHeaders (if the entry carries that field; "" becomes None)
+
+    This mutates `tax_set` and returns it for convenience.
+    """
+    hits.freeze()
+    taxon_keys = hits.taxon_keys
+
+    for obj in tax_set.values():
+        rows = hits.rows(obj.pop("hits"))
+        row_list = rows.tolist()
+
+        obj["names"] = [taxon_keys[c] for c in hits.taxon_codes[rows].tolist()]
+        obj["geneNames"] = hits.gene_names.take(row_list)
+
+        if "eValues" in obj:
+            obj["eValues"] = hits.e_values[rows].tolist() if hits.e_values is not None else []
+
+        if "fastaHeaders" in obj:
+            if hits.fasta_headers is not None:
+                obj["fastaHeaders"] = [h if h != "" else None for h in hits.fasta_headers.take(row_list)]
+            else:
+                obj["fastaHeaders"] = []
+
+    return tax_set
+
+
+def evalue_order(e_values: np.ndarray, top_k: int = 0) -> np.ndarray:
+    """
+    Positions of `e_values` in ascending order, ties in input order (like a stable sort).
+
+    With 0 < top_k < len(e_values) only the positions of the best `top_k` are returned:
+    an O(n) partition picks them and only those are sorted.
+    """
+    if top_k <= 0 or top_k >= len(e_values):
+        return np.argsort(e_values, kind="stable")
+
+    kth = np.partition(e_values, top_k - 1)[top_k - 1]
+    below = np.flatnonzero(e_values < kth)
+    # Of the values equal to the cutoff, a stable sort keeps the earliest ones.
+    ties = np.flatnonzero(e_values == kth)[: top_k - len(below)]
+    best = np.sort(np.concatenate((below, ties)))
+    return best[np.argsort(e_values[best], kind="stable")]
+
+
+def materialize_sorted_hits(tax_set: Dict[TaxonKey, dict], hits: HitTable, top_k: int = 0) -> Dict[TaxonKey, dict]:
+    """
+    `materialize_hits` followed by `sort_hits_by_evalue`, in one pass over row indices.
+
+    Hits are ordered by sorting each taxon's e-values with NumPy, and only then are the
+    per-hit lists built, so no rows are zipped, sorted and unzipped in Python. With top_k > 0,
+    each taxon keeps only its best `top_k` hits (the first ones without e-values) and gets
+    a "hitCount" with its full number of hits; the rest are never decoded.
+
+    This mutates `tax_set` and returns it for convenience.
+    """
+    hits.freeze()
+    taxon_keys = hits.taxon_keys
+    e_values = hits.e_values
+
+    for obj in tax_set.values():
+        rows = hits.rows(obj.pop("hits"))
+
+        if "eValues" in obj and (e_values is None or ("fastaHeaders" in obj and hits.fasta_headers is None)):
+            # The legacy sort zips the hit lists with an empty e-value (or header) list, which
+            # empties all of them; this only ever happens to the root and is kept as is.
+            rows = rows[:0]
+
+        if top_k > 0:
+            obj["hitCount"] = len(rows)
+        if "eValues" in obj and len(rows) > 1:
+            rows = rows[evalue_order(e_values[rows], top_k)]
+        elif top_k > 0:
+            rows = rows[:top_k]
+        row_list = rows.tolist()
+
+        obj["names"] = [taxon_keys[c] for c in hits.taxon_codes[rows].tolist()]
+        obj["geneNames"] = hits.gene_names.take(row_list)
+
+        if "eValues" in obj:
+            obj["eValues"] = e_values[rows].tolist() if e_values is not None else []
+
+        if "fastaHeaders" in obj:
+            if hits.fasta_headers is not None:
+                obj["fastaHeaders"] = [h if h != "" else None for h in hits.fasta_headers.take(row_list)]
+            else:
+                obj["fastaHeaders"] = []
+
+    return tax_set
@@ -1,27 +1,39 @@
 from __future__ import annotations
 
 import copy
-from typing import Any, Dict, List, Tuple
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-import taxopy
+import numpy as np
 
-from app.core.config import ALLOWED_RANKS
-from app.core.taxdb import get_taxdb
+from app.core.config import ALLOWED_RANKS, PARSE_SHARD_MIN_BYTES
+from app.core.executor import run_sharded
+from app.core.taxdb import resolve_lineages
+from app.utils.hits import HitTable
+from app.utils.streaming import ByteRangeReader, iter_lines, open_upload
 
 
 TaxonKey = str
 Lineage = List[List[str]]  # list of [rank, name] pairs
 TaxonEntry = Dict[str, Any]
 TaxonSet = Dict[TaxonKey, TaxonEntry]
+ProgressCallback = Callable[..., None]  # progress(stage, **counters)
+
+# How often (in lines) the parser reports progress.
+PROGRESS_EVERY_LINES = 100_000
 
 
 def build_raw_taxon_index(
     header_line: str,
-    lines: List[str],
-) -> Tuple[TaxonSet, List[Lineage], bool, bool]:
+    lines: Iterable[str],
+    progress: Optional[ProgressCallback] = None,
+) -> Tuple[TaxonSet, List[Lineage], HitTable, bool, bool]:
     """
     Parse TSV-like input lines and build a raw taxon index.
 
+    `lines` is consumed once, so it may be a lazy iterator over an upload stream.
+    If given, `progress` is called every PROGRESS_EVERY_LINES lines and once lineages are resolved.
+
     Expected columns per line:
       0: gene_name (string)
       1: taxID (string; "NA" or "" will be mapped to root)
@@ -30,18 +42,205 @@ def build_raw_taxon_index(
 
     Returns:
       raw_taxa:
-        A dict keyed by "<name> <rank>" with rawCounts/totCounts and collected metadata.
+        A dict keyed by "<name> <rank>" with rawCounts/totCounts. Per-hit metadata is not stored
+        here: each entry lists the taxon codes of its hits under "hits" and keeps
+        names/geneNames/eValues/fastaHeaders as placeholders until `materialize_hits`.
       raw_lineages:
-        A list of full taxonomic paths (each path is [ [rank,name], ... ]) for each *new* taxID encountered.
+        A list of full taxonomic paths (each path is [ [rank,name], ... ]) for each *new* taxon encountered;
+        taxIDs pooled under one key (homonyms, merged taxIDs) share a single path.
+      hits:
+        Columnar table with one row per input line.
       has_evalues:
         Whether the input appears to include e-values.
       has_fasta_headers:
         Whether the input appears to include fasta headers.
     """
-    taxdb = get_taxdb()
+    has_evalues, has_fasta_headers = detect_columns(header_line)
+    taxid_to_code, hits, lines_parsed = parse_hit_lines(lines, has_evalues, has_fasta_headers, progress)
+    return index_parsed_hits(taxid_to_code, hits, lines_parsed, progress)
+
+
+def detect_columns(header_line: str) -> Tuple[bool, bool]:
+    """Whether the input has e-values and FASTA headers, judging by its header line."""
+    return "value" in header_line.lower(), "fasta" in header_line.lower()
+
+
+def parse_hit_lines(
+    lines: Iterable[str],
+    has_evalues: bool,
+    has_fasta_headers: bool,
+    progress: Optional[ProgressCallback] = None,
+) -> Tuple[Dict[str, int], HitTable, int]:
+    """
+    The per-line part of `build_raw_taxon_index`: split each line into a hit row.
+
+    Returns the taxID -> provisional code map (codes in order of first appearance, root "1" is 0),
+    the hit table with rows tagged by provisional code, and the number of lines parsed.
+    """
+    hits = HitTable(has_evalues, has_fasta_headers)
+
+    # Map taxID -> provisional code (order of first appearance); lineages are resolved after parsing.
+    taxid_to_code: Dict[str, int] = {"1": 0}
+
+    lines_parsed = 0
+    for lines_parsed, line in enumerate(lines, 1):
+        if progress is not None and lines_parsed % PROGRESS_EVERY_LINES == 0:
+            progress("parsing", linesParsed=lines_parsed)
+
+        cols = line.split("\t")
+        n_cols = len(cols)
+
+        gene_name = cols[0]
+        tax_id = cols[1] if n_cols > 1 else "1"
+
+        e_value = cols[2] if n_cols > 2 else ""
+        fasta_header = cols[3] if n_cols > 3 else ""
+
+        if tax_id in ("NA", ""):
+            tax_id = "1"
+
+        code = taxid_to_code.get(tax_id)
+        if code is None:
+            code = taxid_to_code[tax_id] = len(taxid_to_code)
+
+        hits.append(
+            code,
+            gene_name,
+            (float(e_value) if e_value != "" else 1.0) if has_evalues else 0.0,
+            fasta_header,
+        )
+
+    return taxid_to_code, hits, lines_parsed
+
+
+def parse_shard(path: str, start: int, end: int, has_evalues: bool, has_fasta_headers: bool) -> Tuple[List[str], HitTable, int]:
+    """
+    Shard worker: `parse_hit_lines` over bytes [start, end) of the upload, which must start and end at
+    line boundaries. Returns the shard's taxIDs in provisional-code order instead of the map.
+    """
+    with open(path, "rb") as f:
+        lines = iter_lines(ByteRangeReader(f, start, end))
+        taxid_to_code, hits, lines_parsed = parse_hit_lines(lines, has_evalues, has_fasta_headers)
+    return list(taxid_to_code), hits, lines_parsed
+
+
+def build_raw_taxon_index_sharded(
+    path: str,
+    shards: int,
+    progress: Optional[ProgressCallback] = None,
+    min_shard_bytes: int = PARSE_SHARD_MIN_BYTES,
+) -> Tuple[TaxonSet, List[Lineage], HitTable, bool, bool]:
+    """
+    `build_raw_taxon_index` for an upload on disk, with the per-line work split across processes.
 
-    has_evalues = "value" in header_line.lower()
-    has_fasta_headers = "fasta" in header_line.lower()
+    The data lines are cut at line boundaries into up to `shards` byte ranges of at least
+    `min_shard_bytes` each, parsed in parallel, and merged in file order: provisional codes are
+    renumbered by first appearance across the shards and the hit rows are concatenated, so the
+    result is identical to a sequential parse (including hit order within each taxon).
+    """
+    with open(path, "rb") as f:
+        header_line = f.readline().decode("utf-8").rstrip("\n")
+        header_line = header_line[:-1] if header_line.endswith("\r") else header_line
+        data_start = f.tell()
+    has_evalues, has_fasta_headers = detect_columns(header_line)
+
+    ranges = shard_ranges(path, data_start, shards, min_shard_bytes)
+    args = [(path, start, end, has_evalues, has_fasta_headers) for start, end in ranges]
+    if len(args) > 1:
+        results = run_sharded(parse_shard, args)
+    else:
+        results = [parse_shard(*a) for a in args]
+
+    taxid_to_code: Dict[str, int] = {"1": 0}
+    code_maps = []
+    for shard_tax_ids, _, _ in results:
+        code_maps.append([taxid_to_code.setdefault(tax_id, len(taxid_to_code)) for tax_id in shard_tax_ids])
+
+    hits = HitTable.concat([shard_hits for _, shard_hits, _ in results], code_maps, has_evalues, has_fasta_headers)
+    lines_parsed = sum(n for _, _, n in results)
+    if progress is not None:
+        progress("parsing", linesParsed=lines_parsed)
+
+    return index_parsed_hits(taxid_to_code, hits, lines_parsed, progress)
+
+
+def parse_sample(path: str) -> Tuple[List[str], HitTable, int]:
+    """Sample worker: `parse_hit_lines` over a whole (possibly compressed) upload, returning its taxIDs like `parse_shard`."""
+    with open_upload(path) as stream:
+        lines = iter_lines(stream)
+        has_evalues, has_fasta_headers = detect_columns(next(lines, ""))
+        taxid_to_code, hits, lines_parsed = parse_hit_lines(lines, has_evalues, has_fasta_headers)
+    return list(taxid_to_code), hits, lines_parsed
+
+
+def build_raw_taxon_index_samples(
+    paths: List[str],
+    parallel: bool = False,
+    progress: Optional[ProgressCallback] = None,
+) -> Tuple[Tuple[TaxonSet, List[Lineage], HitTable, bool, bool], np.ndarray, List[int]]:
+    """
+    One raw taxon index over several uploads (samples), so the union of their taxIDs is resolved once.
+
+    Samples are parsed separately (in parallel processes if `parallel`) and merged like shards,
+    in the given order. Per-hit columns other than the taxon are not needed for sample
+    comparisons, so the index reports neither e-values nor FASTA headers.
+
+    Returns the `build_raw_taxon_index` tuple, the sample index of every hit row and the
+    number of lines parsed per sample.
+    """
+    args = [(path,) for path in paths]
+    if parallel and len(args) > 1:
+        results = run_sharded(parse_sample, args)
+    else:
+        results = [parse_sample(*a) for a in args]
+
+    taxid_to_code: Dict[str, int] = {"1": 0}
+    code_maps = []
+    for sample_tax_ids, _, _ in results:
+        code_maps.append([taxid_to_code.setdefault(tax_id, len(taxid_to_code)) for tax_id in sample_tax_ids])
+
+    hits = HitTable.concat([sample_hits for _, sample_hits, _ in results], code_maps, False, False)
+    sample_of_row = np.repeat(np.arange(len(results)), [len(sample_hits) for _, sample_hits, _ in results])
+    lines_per_sample = [n for _, _, n in results]
+    if progress is not None:
+        progress("parsing", linesParsed=sum(lines_per_sample))
+
+    raw_index = index_parsed_hits(taxid_to_code, hits, sum(lines_per_sample), progress)
+    return raw_index, sample_of_row, lines_per_sample
+
+
+def shard_ranges(path: str, data_start: int, shards: int, min_shard_bytes: int) -> List[Tuple[int, int]]:
+    """Split bytes [data_start, EOF) of a file into at most `shards` ranges that end at line boundaries."""
+    size = os.path.getsize(path)
+    n = max(1, min(shards, (size - data_start) // max(min_shard_bytes, 1)))
+
+    bounds = [data_start]
+    with open(path, "rb") as f:
+        for i in range(1, n):
+            target = data_start + (size - data_start) * i // n
+            if target <= bounds[-1]:
+                continue
+            # The next line starts after the newline that ends the line containing byte target - 1.
+            f.seek(target - 1)
+            f.readline()
+            boundary = f.tell()
+            if bounds[-1] < boundary < size:
+                bounds.append(boundary)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def index_parsed_hits(
+    taxid_to_code: Dict[str, int],
+    hits: HitTable,
+    lines_parsed: int,
+    progress: Optional[ProgressCallback] = None,
+) -> Tuple[TaxonSet, List[Lineage], HitTable, bool, bool]:
+    """
+    The per-taxon part of `build_raw_taxon_index`: resolve the lineages of the parsed taxIDs
+    and build the raw taxon entries. Returns the same tuple as `build_raw_taxon_index`.
+    """
+    has_evalues, has_fasta_headers = hits.has_evalues, hits.has_fasta_headers
 
     # We key nodes by "name rank" everywhere in your pipeline.
     root_key = "root root"
@@ -53,84 +252,78 @@ def build_raw_taxon_index(
             "name": "root",
             "rank": "root",
             "lnIndex": 0,
-            "names": [],
-            "geneNames": [],
-            "eValues": [],
-            "fastaHeaders": [],
+            "names": None,
+            "geneNames": None,
+            "eValues": None,
+            "fastaHeaders": None,
             "children": [],
             "directChildren": [],
+            "hits": [hits.taxon_code(root_key)],
         }
     }
 
-    # Map taxID -> "<name> <rank>" key to avoid re-creating nodes.
-    taxid_to_key: Dict[str, TaxonKey] = {"1": root_key}
+    # Resolve every distinct taxID in one batch, then create nodes in order of first appearance.
+    new_tax_ids = list(taxid_to_code)[1:]
+    if progress is not None:
+        progress("resolving lineages", linesParsed=lines_parsed)
+    resolved = resolve_lineages([int(tax_id) for tax_id in new_tax_ids])
+    if progress is not None:
+        progress("resolving lineages", taxaResolved=len(new_tax_ids))
 
-    # Store lineages only for newly discovered taxIDs (your later step uses this list).
+    # Store lineages only for newly discovered taxa (your later step uses this list).
     raw_lineages: List[Lineage] = [[["root", "root"]]]
+    codes = [hits.taxon_code(root_key)]
 
-    for line in lines:
-        cols = [c.replace("\r", "") for c in line.split("\t")]
-
-        gene_name = cols[0] if len(cols) > 0 else ""
-        tax_id = cols[1] if len(cols) > 1 else "1"
+    for tax_id, (name, rank, lineage_rank_name) in zip(new_tax_ids, resolved):
+        key = f"{name} {rank}"
 
-        e_value = cols[2] if len(cols) > 2 else ""
-        fasta_header = cols[3] if len(cols) > 3 else ""
+        # The index provides rank->name leaf-first; we convert to [rank,name] pairs and reverse to get root->... order.
+        rank_name_path: Lineage = [["root", "root"]] + [[k, v] for k, v in lineage_rank_name.items()][::-1]
 
-        if tax_id in ("NA", ""):
-            tax_id = "1"
+        # Ensure leaf is included
+        if not (rank_name_path[-1][0] == rank and rank_name_path[-1][1] == name):
+            rank_name_path.append([rank, name])
 
-        # New taxon
-        if tax_id not in taxid_to_key:
-            taxon = taxopy.Taxon(int(tax_id), taxdb)
-            name = taxon.name
-            rank = taxon.rank
-            key = f"{name} {rank}"
-
-            # taxopy provides rank->name; we convert to [rank,name] pairs and reverse to get root->... order.
-            lineage_rank_name = taxon.rank_name_dictionary
-            rank_name_path: Lineage = [["root", "root"]] + [[k, v] for k, v in lineage_rank_name.items()][::-1]
-
-            # Ensure leaf is included
-            if not (rank_name_path[-1][0] == rank and rank_name_path[-1][1] == name):
-                rank_name_path.append([rank, name])
+        code = hits.taxon_code(key)
 
+        # Homonyms (same name and rank, different taxID) share one node and pool their hits.
+        if key not in raw_taxa:
             raw_taxa[key] = {
                 "taxID": tax_id,
-                "rawCount": 1,
-                "totCount": 1,
+                "rawCount": 0,
+                "totCount": 0,
                 "name": name,
                 "rank": rank,
-                "names": [key],
-                "geneNames": [gene_name],
+                "names": None,
+                "geneNames": None,
                 "children": [],
                 "directChildren": [],
             }
 
             if has_evalues:
-                raw_taxa[key]["eValues"] = [float(e_value)] if e_value != "" else [1.0]
+                raw_taxa[key]["eValues"] = None
 
             if has_fasta_headers:
-                raw_taxa[key]["fastaHeaders"] = [fasta_header] if fasta_header != "" else [None]
+                raw_taxa[key]["fastaHeaders"] = None
+
+            raw_taxa[key]["hits"] = [code]
 
-            taxid_to_key[tax_id] = key
+            # One lineage per node: a second lineage for the same key would pass its hits up twice.
             raw_lineages.append(rank_name_path)
-            continue
 
-        # Existing taxon
-        key = taxid_to_key[tax_id]
-        raw_taxa[key]["totCount"] += 1
-        raw_taxa[key]["rawCount"] += 1
-        raw_taxa[key]["geneNames"].append(gene_name)
-        raw_taxa[key]["names"].append(key)
+        codes.append(code)
 
-        if has_evalues:
-            raw_taxa[key]["eValues"].append(float(e_value) if e_value != "" else 1.0)
+    hits.recode(codes)
 
-        if has_fasta_headers:
-            raw_taxa[key]["fastaHeaders"].append(fasta_header if fasta_header != "" else None)
+    # Counts come straight from the code column instead of per-line increments.
+    hits.freeze()
+    counts = np.bincount(hits.taxon_codes, minlength=len(hits.taxon_keys)).tolist()
+    for key, entry in raw_taxa.items():
+        count = counts[entry["hits"][0]]
+        entry["rawCount"] += count
+        entry["totCount"] += count
 
-    return raw_taxa, raw_lineages, has_evalues, has_fasta_headers
+    return raw_taxa, raw_lineages, hits, has_evalues, has_fasta_headers
 
 
 def build_rank_filtered_taxon_set(
@@ -145,7 +338,7 @@ def build_rank_filtered_taxon_set(
     Core idea:
       - Some lineages include ranks you don't want to display.
       - The "leaf" (original hit taxon) may be at a filtered-out rank.
-      - We propagate that leaf's counts + metadata upward until we hit the next kept rank.
+      - We propagate that leaf's counts + hit references upward until we hit the next kept rank.
       - We also prune those filtered ranks from the lineage paths.
 
     Returns:
@@ -164,11 +357,8 @@ def build_rank_filtered_taxon_set(
     for i in reversed(range(len(raw_lineages))):
         lineage = raw_lineages[i]
 
-        inherited_key: str = ""
         inherited_count: int = 0
-        inherited_gene_names: List[str] = []
-        inherited_evalues: List[float] = []
-        inherited_fasta_headers: List[str | None] = []
+        inherited_hits: List[int] = []
 
         for j in reversed(range(len(lineage))):
             rank, name = lineage[j][0], lineage[j][1]
@@ -181,23 +371,13 @@ def build_rank_filtered_taxon_set(
                         existing_taxa[key] = raw_taxa[key]
                         existing_taxa[key]["unaCount"] = raw_taxa[key]["rawCount"]
 
-                    # Push inherited counts/metadata into this kept rank node.
+                    # Push inherited counts/hits into this kept rank node.
                     if inherited_count > 0:
                         existing_taxa[key]["unaCount"] += inherited_count
                         existing_taxa[key]["totCount"] += inherited_count
-                        existing_taxa[key]["geneNames"] += inherited_gene_names
-                        existing_taxa[key]["names"] += [inherited_key] * inherited_count
-
-                        if has_evalues:
-                            existing_taxa[key]["eValues"] += inherited_evalues
-                            inherited_evalues = []
-
-                        if has_fasta_headers:
-                            existing_taxa[key]["fastaHeaders"] += inherited_fasta_headers
-                            inherited_fasta_headers = []
+                        existing_taxa[key]["hits"] += inherited_hits
 
-                        inherited_key = ""
-                        inherited_gene_names = []
+                        inherited_hits = []
                         inherited_count = 0
 
                 # Node does not exist in raw_taxa → create it if needed (intermediate kept rank).
@@ -212,46 +392,31 @@ def build_rank_filtered_taxon_set(
                             "totCount": 0,
                             "name": name,
                             "rank": rank,
-                            "names": [],
-                            "geneNames": [],
+                            "names": None,
+                            "geneNames": None,
                         }
                         if has_evalues:
-                            created_taxa[key]["eValues"] = []
+                            created_taxa[key]["eValues"] = None
                         if has_fasta_headers:
-                            created_taxa[key]["fastaHeaders"] = []
+                            created_taxa[key]["fastaHeaders"] = None
+                        created_taxa[key]["hits"] = []
 
                     if inherited_count > 0:
                         created_taxa[key]["unaCount"] += inherited_count
                         created_taxa[key]["totCount"] += inherited_count
-                        created_taxa[key]["geneNames"] += inherited_gene_names
-                        created_taxa[key]["names"] += [inherited_key] * inherited_count
-
-                        if has_evalues:
-                            created_taxa[key]["eValues"] += inherited_evalues
-                            inherited_evalues = []
+                        created_taxa[key]["hits"] += inherited_hits
 
-                        if has_fasta_headers:
-                            created_taxa[key]["fastaHeaders"] += inherited_fasta_headers
-                            inherited_fasta_headers = []
-
-                        inherited_key = ""
-                        inherited_gene_names = []
+                        inherited_hits = []
                         inherited_count = 0
 
             else:
                 # Filtered-out rank: prune it from the lineage and (if it's the leaf) inherit its data upward.
                 if j == len(lineage) - 1:
-                    # Leaf taxon at a disallowed rank → inherit its counts/metadata upward.
+                    # Leaf taxon at a disallowed rank → inherit its counts/hits upward.
                     dropped_taxa[key] = raw_taxa[key]
-                    inherited_key = key
-                    inherited_gene_names = raw_taxa[key]["geneNames"]
+                    inherited_hits = raw_taxa[key]["hits"]
                     inherited_count = raw_taxa[key]["rawCount"]
 
-                    if has_evalues:
-                        inherited_evalues = raw_taxa[key]["eValues"]
-                    if has_fasta_headers:
-                        inherited_fasta_headers = raw_taxa[key]["fastaHeaders"]
-
                     # Remove leaf and everything after it (there is nothing after leaf, but keeps your old intent)
                     filtered_lineages[i] = filtered_lineages[i][:j]
                 else:
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+from app.core.config import ALLOWED_RANKS
+
+TaxonKey = str
+TaxonSet = Dict[TaxonKey, Dict[str, Any]]
+
+ROOT_KEY = "root root"
+
+
+def build_rank_tables(tax_set: TaxonSet, ranks: Sequence[str] = ALLOWED_RANKS) -> Dict[str, List[TaxonKey]]:
+    """
+    Taxon keys of every rank in `ranks`, by descending totCount (ties keep taxSet order).
+
+    One pass over the finished tax_set (counts already propagated); ranks without taxa get
+    an empty table, so every allowed rank can be queried.
+    """
+    tables: Dict[str, List[TaxonKey]] = {rank: [] for rank in ranks}
+    for key, obj in tax_set.items():
+        table = tables.get(obj["rank"])
+        if table is not None:
+            table.append(key)
+    for table in tables.values():
+        table.sort(key=lambda key: -tax_set[key]["totCount"])
+    return tables
+
+
+def rank_rows(
+    tax_set: TaxonSet,
+    keys: Sequence[TaxonKey],
+    limit: int,
+    min_count: int = 0,
+    sort_by: str = "totCount",
+) -> List[Dict[str, Any]]:
+    """
+    The first `limit` taxa of a rank table with at least `min_count` in their `sort_by` field
+    ("totCount" or "unaCount"), each with its share of all hits (the root's totCount).
+
+    Tables are stored by totCount; for "unaCount" they are re-sorted here, ties by totCount.
+    """
+    if sort_by != "totCount":
+        keys = sorted(keys, key=lambda key: -tax_set[key][sort_by])
+    root_total = tax_set[ROOT_KEY]["totCount"] if ROOT_KEY in tax_set else 0
+
+    rows = []
+    for key in keys:
+        obj = tax_set[key]
+        if obj[sort_by] < min_count:
+            # Tables are sorted by this field, so no later taxon qualifies either.
+            break
+        rows.append(
+            {
+                "key": key,
+                "name": obj["name"],
+                "taxID": obj["taxID"],
+                "totCount": obj["totCount"],
+                "unaCount": obj["unaCount"],
+                "share": obj["totCount"] / root_total if root_total else 0.0,
+            }
+        )
+        if len(rows) >= limit:
+            break
+    return rows
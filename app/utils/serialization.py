@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+
+# Response formats of the dataset endpoints and their media types.
+RESPONSE_FORMATS = {
+    "json": "application/json",
+    "compact": "application/vnd.taxsun.compact+json",
+    "msgpack": "application/msgpack",
+}
+
+
+def encode_json(content: Any) -> bytes:
+    """
+    Serialize a response body exactly like FastAPI's default JSONResponse does.
+
+    Lets a response be rendered once, stored, and later replayed byte for byte.
+    """
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def to_compact(dataset: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a /load_tsv_data result into the compact, deduplicated layout.
+
+    - taxa are referred to by their integer position in `taxa` (taxSet order)
+    - taxon keys, names, ranks and per-hit "names" are indices into one `strings` table
+    - children/directChildren and `lns` are arrays of taxon IDs
+    - per-hit data is stored column-wise in `hits`; hits of taxon t are rows
+      taxa.hitOffsets[t] to taxa.hitOffsets[t + 1]
+    """
+    tax_set = dataset["taxSet"]
+    e_value_enabled = dataset["eValueEnabled"]
+    fasta_enabled = dataset["fastaEnabled"]
+
+    taxon_ids = {key: i for i, key in enumerate(tax_set)}
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def string_id(value: str) -> int:
+        sid = string_ids.get(value)
+        if sid is None:
+            sid = string_ids[value] = len(strings)
+            strings.append(value)
+        return sid
+
+    taxa: Dict[str, List[Any]] = {
+        "key": [],
+        "name": [],
+        "rank": [],
+        "taxID": [],
+        "rawCount": [],
+        "unaCount": [],
+        "totCount": [],
+        "lnIndex": [],
+        "children": [],
+        "directChildren": [],
+        "hitOffsets": [0],
+    }
+    hits: Dict[str, List[Any]] = {"name": [], "geneName": []}
+    if e_value_enabled:
+        hits["eValue"] = []
+    if fasta_enabled:
+        hits["fastaHeader"] = []
+
+    for key, obj in tax_set.items():
+        taxa["key"].append(string_id(key))
+        taxa["name"].append(string_id(obj["name"]))
+        taxa["rank"].append(string_id(obj["rank"]))
+        taxa["taxID"].append(obj["taxID"])
+        taxa["rawCount"].append(obj["rawCount"])
+        taxa["unaCount"].append(obj["unaCount"])
+        taxa["totCount"].append(obj["totCount"])
+        taxa["lnIndex"].append(obj["lnIndex"])
+        taxa["children"].append([taxon_ids[child] for child in obj["children"]])
+        taxa["directChildren"].append([taxon_ids[child] for child in obj["directChildren"]])
+        if "hitCount" in obj:
+            taxa.setdefault("hitCount", []).append(obj["hitCount"])
+
+        hits["name"].extend(string_id(name) for name in obj["names"])
+        hits["geneName"].extend(obj["geneNames"])
+        if e_value_enabled:
+            hits["eValue"].extend(obj.get("eValues", []))
+        if fasta_enabled:
+            hits["fastaHeader"].extend(obj.get("fastaHeaders", []))
+        taxa["hitOffsets"].append(len(hits["geneName"]))
+
+    compact = {
+        "format": "compact",
+        "strings": strings,
+        "taxa": taxa,
+        "hits": hits,
+        "lns": [[taxon_ids[f"{name} {rank}"] for rank, name in ln] for ln in dataset["lns"]],
+        "eValueEnabled": e_value_enabled,
+        "fastaEnabled": fasta_enabled,
+        "rankPatternFull": dataset["rankPatternFull"],
+    }
+    if "hitTopK" in dataset:
+        compact["hitTopK"] = dataset["hitTopK"]
+    return compact
+
+
+def render_dataset(dataset: Dict[str, Any], response_format: str = "json") -> bytes:
+    """Render a /load_tsv_data result in one of RESPONSE_FORMATS ("msgpack" is the compact layout, binary-encoded)."""
+    if response_format == "json":
+        return encode_json(dataset)
+
+    compact = to_compact(dataset)
+    if response_format == "msgpack":
+        return msgpack.packb(compact, use_bin_type=True)
+    return encode_compact_json(compact)
+
+
+def encode_compact_json(content: Any) -> bytes:
+    """JSON for bodies that need not match FastAPI's rendering byte for byte: orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
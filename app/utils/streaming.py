@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import codecs
+import gzip
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import UPLOAD_CHUNK_SIZE
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional format
+    zstandard = None
+
+# Leading bytes of the compressed upload formats we accept.
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def iter_chunks(stream: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a binary stream in fixed-size chunks, closing it at the end (e.g. as a response body)."""
+    with stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_lines(stream: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Lazily yield UTF-8 decoded lines from a binary stream.
+
+    The stream is consumed in fixed-size chunks, so only one chunk plus the
+    current partial line is held in memory at a time:
+      - lines split across chunk boundaries (including multi-byte characters) are stitched back together
+      - trailing "\\r" is stripped, so CRLF files behave like LF files
+      - a final line without a trailing newline is still yielded
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        # Last piece has no newline yet; keep it until the next chunk arrives.
+        pending = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending[:-1] if pending.endswith("\r") else pending
+
+
+def upload_compression(path: str) -> Optional[str]:
+    """
+    "gzip" or "zstd" if the file starts with that format's magic bytes, else None.
+
+    Raises 415 for zstd input when the zstandard package is not installed.
+    """
+    with open(path, "rb") as f:
+        head = f.read(len(ZSTD_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise HTTPException(status_code=415, detail="zstd-compressed uploads are not supported on this server")
+        return "zstd"
+    return None
+
+
+@contextmanager
+def open_upload(path: str) -> Iterator[BinaryIO]:
+    """
+    Open an upload for reading, decompressing gzip or zstd input on the fly.
+
+    The decompressed data is produced chunk by chunk as it is read (e.g. by `iter_lines`),
+    so a compressed upload is never inflated in memory or on disk as a whole.
+    """
+    compression = upload_compression(path)
+    with open(path, "rb") as raw:
+        if compression == "gzip":
+            with gzip.GzipFile(fileobj=raw, mode="rb") as stream:
+                yield stream
+        elif compression == "zstd":
+            with zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True) as stream:
+                try:
+                    yield stream
+                except zstandard.ZstdError as exc:
+                    # zstandard's errors cannot be pickled back from a pool process.
+                    raise ValueError(f"Corrupt zstd upload: {exc}") from None
+        else:
+            yield raw
+
+
+class ByteRangeReader:
+    """Binary stream over bytes [start, end) of an open file, for reading one shard of an upload."""
+
+    def __init__(self, f: BinaryIO, start: int, end: int) -> None:
+        f.seek(start)
+        self._f = f
+        self._remaining = end - start
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        size = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+def spool_to_file(
+    stream: BinaryIO,
+    directory: Optional[str] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Tuple[Path, str]:
+    """
+    Copy a binary stream into a named temporary file, hashing it on the way.
+
+    Returns the file path (the caller is responsible for deleting it) and the
+    SHA-256 hex digest of the content.
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=directory, prefix="taxsun-upload-", delete=False) as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    return Path(f.name), digest.hexdigest()
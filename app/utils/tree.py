@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import ALLOWED_RANKS
+
+
+Lineage = List[List[str]]  # list of [rank, name] pairs
+TaxonKey = str
+TaxonEntry = Dict[str, Any]
+TaxonSet = Dict[TaxonKey, TaxonEntry]
+
+ROOT_KEY = "root root"
+
+
+class _PathNode:
+    """
+    One node of the trie of rank-filtered lineages.
+
+    Identical filtered lineages end on the same node, so deduplication is an identity check,
+    and each node's sort key (concatenated names from the root) is computed once, from its parent's.
+    """
+
+    __slots__ = ("key", "rank", "name", "parent", "depth", "sort_key", "children")
+
+    def __init__(self, key: TaxonKey, rank: str, name: str, parent: Optional["_PathNode"]) -> None:
+        self.key = key
+        self.rank = rank
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.sort_key = parent.sort_key + name if parent is not None else name
+        self.children: Dict[TaxonKey, _PathNode] = {}
+
+    def lineage(self) -> Lineage:
+        path = []
+        node: Optional[_PathNode] = self
+        while node is not None:
+            path.append([node.rank, node.name])
+            node = node.parent
+        return path[::-1]
+
+
+def build_taxon_tree(
+    raw_taxa: TaxonSet,
+    raw_lineages: List[Lineage],
+    has_evalues: bool,
+    has_fasta_headers: bool,
+) -> Tuple[TaxonSet, List[Lineage]]:
+    """
+    Single-pass replacement for `build_rank_filtered_taxon_set` + `dedupe_and_sort_lineages`
+    + `propagate_counts_and_build_children`, producing the same tax_set and lineages.
+
+    Steps:
+      1. Walk raw lineages once (bottom-up, same order as the legacy filter), keeping allowed
+         ranks, pushing a filtered-out leaf's counts/hits into its nearest kept ancestor and
+         inserting the filtered path into a trie.
+      2. Sort lineages by their trie node's concatenated-name key and drop neighbouring duplicates.
+      3. Walk each remaining lineage up its parent pointers to add counts, children and directChildren.
+
+    This mutates the entries of `raw_taxa` that are kept, like the legacy stages do.
+    """
+    allowed_ranks = set(ALLOWED_RANKS)
+
+    existing_taxa: TaxonSet = {}
+    created_taxa: TaxonSet = {}
+
+    trie_roots: Dict[TaxonKey, _PathNode] = {}
+    terminals: List[_PathNode] = [None] * len(raw_lineages)
+
+    for i in reversed(range(len(raw_lineages))):
+        lineage = raw_lineages[i]
+
+        inherited_count = 0
+        inherited_hits: List[int] = []
+        kept: List[Tuple[TaxonKey, str, str]] = []
+
+        for j in reversed(range(len(lineage))):
+            rank, name = lineage[j][0], lineage[j][1]
+            key = f"{name} {rank}"
+
+            if rank not in allowed_ranks:
+                # Filtered-out leaf: its counts/hits move up to the next kept rank.
+                if j == len(lineage) - 1:
+                    inherited_hits = raw_taxa[key]["hits"]
+                    inherited_count = raw_taxa[key]["rawCount"]
+                continue
+
+            kept.append((key, rank, name))
+
+            if key in raw_taxa:
+                entry = existing_taxa.get(key)
+                if entry is None:
+                    entry = existing_taxa[key] = raw_taxa[key]
+                    entry["unaCount"] = entry["rawCount"]
+            else:
+                entry = created_taxa.get(key)
+                if entry is None:
+                    entry = created_taxa[key] = {
+                        "taxID": "",
+                        "children": [],
+                        "directChildren": [],
+                        "unaCount": 0,
+                        "rawCount": 0,
+                        "totCount": 0,
+                        "name": name,
+                        "rank": rank,
+                        "names": None,
+                        "geneNames": None,
+                    }
+                    if has_evalues:
+                        entry["eValues"] = None
+                    if has_fasta_headers:
+                        entry["fastaHeaders"] = None
+                    entry["hits"] = []
+
+            if inherited_count > 0:
+                entry["unaCount"] += inherited_count
+                entry["totCount"] += inherited_count
+                entry["hits"] += inherited_hits
+                inherited_hits = []
+                inherited_count = 0
+
+        node, children = None, trie_roots
+        for key, rank, name in reversed(kept):
+            child = children.get(key)
+            if child is None:
+                child = children[key] = _PathNode(key, rank, name, node)
+            node, children = child, child.children
+        terminals[i] = node
+
+    tax_set: TaxonSet = {**created_taxa, **existing_taxa}
+
+    # Stable sort on the concatenated names, then drop a lineage only if it equals its predecessor.
+    ordered = sorted(terminals, key=lambda node: node.sort_key)
+    unique = [node for k, node in enumerate(ordered) if k == 0 or node is not ordered[k - 1]]
+
+    root_entry = tax_set[ROOT_KEY]
+    for leaf in unique:
+        leaf_entry = tax_set[leaf.key]
+        leaf_entry["lnIndex"] = leaf.depth
+        una_count = leaf_entry["unaCount"]
+
+        # Ancestors bottom-up, skipping the leaf itself and the root (depth 0).
+        child, ancestor = leaf, leaf.parent
+        while ancestor is not None and ancestor.parent is not None:
+            entry = tax_set[ancestor.key]
+            entry["totCount"] += una_count
+            entry["children"].append(leaf.key)
+
+            direct_children = entry["directChildren"]
+            if len(direct_children) == 0 or direct_children[-1] != child.key:
+                direct_children.append(child.key)
+
+            entry["lnIndex"] = ancestor.depth
+            child, ancestor = ancestor, ancestor.parent
+
+        if leaf.key != ROOT_KEY:
+            root_entry["totCount"] += una_count
+            root_entry["children"].append(leaf.key)
+
+    return tax_set, [leaf.lineage() for leaf in unique]
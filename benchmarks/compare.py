@@ -0,0 +1,36 @@
+"""
+Compare two result files of benchmarks.run, stage by stage (median seconds).
+
+Usage: python -m benchmarks.compare baseline.json candidate.json
+"""
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+
+def _seconds(value) -> str:
+    return f"{value:10.4f}" if value is not None else f"{'-':>10}"
+
+
+def main() -> None:
+    if len(sys.argv) != 3:
+        sys.exit(__doc__.strip().splitlines()[-1])
+    baseline, candidate = (json.loads(Path(p).read_text()) for p in sys.argv[1:])
+
+    if baseline["params"] != candidate["params"]:
+        print("warning: the runs used different parameters", file=sys.stderr)
+
+    rows = [(name, baseline["stages"].get(name, {}).get("median"), candidate["stages"].get(name, {}).get("median"))
+            for name in dict.fromkeys([*baseline["stages"], *candidate["stages"]])]
+    rows.append(("total", baseline["total"]["median"], candidate["total"]["median"]))
+
+    print(f"{'stage':40} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for name, old, new in rows:
+        change = f"{(new - old) / old:+8.1%}" if old and new is not None else f"{'':>8}"
+        print(f"{name:40} {_seconds(old)} {_seconds(new)} {change}")
+
+
+if __name__ == "__main__":
+    main()
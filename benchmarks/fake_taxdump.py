@@ -0,0 +1,81 @@
+"""
+Deterministic fake NCBI taxdump for offline benchmarks.
+
+The same seed always produces the same nodes.dmp/names.dmp/merged.dmp, so benchmark runs on
+different machines or commits see the same taxonomy. Ranks follow the NCBI ladder, with
+"no rank"/"clade" nodes and ranks outside ALLOWED_RANKS (tribe, strain, ...) mixed in, so the
+rank filter has work to do.
+
+Usage: python -m benchmarks.fake_taxdump <output dir> [--taxa 20000] [--seed 1]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+RANK_LADDER = [
+    "superkingdom", "kingdom", "phylum", "subphylum", "class", "subclass", "order", "suborder",
+    "family", "subfamily", "tribe", "genus", "subgenus", "species", "subspecies", "strain",
+]
+UNRANKED = ["no rank", "clade"]
+
+NAME_STEMS = ["Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta", "Eta", "Theta", "Iota", "Kappa", "Lambda", "Sigma"]
+
+DEFAULT_TAXA = 20_000
+DEFAULT_SEED = 1
+
+
+def generate_taxonomy(taxa: int = DEFAULT_TAXA, seed: int = DEFAULT_SEED) -> Tuple[Dict[int, Tuple[int, str]], Dict[int, str]]:
+    """Returns taxID -> (parent taxID, rank) and taxID -> scientific name; taxID 1 is the root."""
+    rng = random.Random(seed)
+    nodes: Dict[int, Tuple[int, str]] = {1: (1, "no rank")}
+    names: Dict[int, str] = {1: "root"}
+    ladder_pos: Dict[int, int] = {1: -1}
+    # Parents are drawn from here; nodes at the bottom of the ladder cannot have children.
+    open_nodes: List[int] = [1]
+
+    for taxid in range(2, taxa + 1):
+        parent = rng.choice(open_nodes)
+        pos = ladder_pos[parent]
+        if rng.random() < 0.15:
+            rank = rng.choice(UNRANKED)
+        else:
+            pos = min(pos + rng.randint(1, 3), len(RANK_LADDER) - 1)
+            rank = RANK_LADDER[pos]
+
+        nodes[taxid] = (parent, rank)
+        names[taxid] = f"{rng.choice(NAME_STEMS)} {taxid}"
+        ladder_pos[taxid] = pos
+        if pos < len(RANK_LADDER) - 1:
+            open_nodes.append(taxid)
+
+    return nodes, names
+
+
+def write_taxdump(out_dir: Path, taxa: int = DEFAULT_TAXA, seed: int = DEFAULT_SEED) -> None:
+    nodes, names = generate_taxonomy(taxa, seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(out_dir / "nodes.dmp", "w", encoding="utf-8") as f:
+        for taxid, (parent, rank) in nodes.items():
+            f.write(f"{taxid}\t|\t{parent}\t|\t{rank}\t|\t\t|\t0\t|\n")
+    with open(out_dir / "names.dmp", "w", encoding="utf-8") as f:
+        for taxid, name in names.items():
+            f.write(f"{taxid}\t|\t{name}\t|\t\t|\tscientific name\t|\n")
+
+    # A few retired taxIDs pointing at live ones, like the real merged.dmp.
+    rng = random.Random(seed)
+    with open(out_dir / "merged.dmp", "w", encoding="utf-8") as f:
+        for old in range(taxa + 1, taxa + 101):
+            f.write(f"{old}\t|\t{rng.randint(2, taxa)}\t|\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--taxa", type=int, default=DEFAULT_TAXA)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+    write_taxdump(args.out_dir, args.taxa, args.seed)
@@ -0,0 +1,126 @@
+"""
+Synthetic /load_tsv_data input ("metagenome") generator.
+
+Draws taxIDs from a taxdump (normally the one from benchmarks.fake_taxdump), so every line
+resolves offline. Hit counts per taxon follow a Zipf-like curve, like real samples where a few
+taxa dominate.
+
+Usage: python -m benchmarks.generate_tsv <taxdump dir> <output.tsv> [--lines N] [--taxa N] ...
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from app.core.config import ALLOWED_RANKS
+
+# Share of lines without a usable taxID ("NA"), which the parser maps to the root.
+UNASSIGNED_SHARE = 0.01
+
+
+def _read_nodes(taxdump_dir: Path) -> Dict[int, Tuple[int, str]]:
+    nodes = {}
+    with open(taxdump_dir / "nodes.dmp", encoding="utf-8") as f:
+        for line in f:
+            cols = line.split("\t")
+            nodes[int(cols[0])] = (int(cols[2]), cols[4])
+    return nodes
+
+
+def _depths(nodes: Dict[int, Tuple[int, str]]) -> Dict[int, int]:
+    depths = {1: 0}
+    for taxid in nodes:
+        path = []
+        while taxid not in depths:
+            path.append(taxid)
+            taxid = nodes[taxid][0]
+        depth = depths[taxid]
+        for t in reversed(path):
+            depth += 1
+            depths[t] = depth
+    return depths
+
+
+def pick_taxids(
+    nodes: Dict[int, Tuple[int, str]],
+    taxa: int,
+    depth: int,
+    filtered_share: float,
+    rng: random.Random,
+) -> List[int]:
+    """
+    `taxa` distinct taxIDs whose lineage depth is as close to `depth` as the taxonomy allows;
+    a `filtered_share` of them have a rank outside ALLOWED_RANKS (they get folded into an ancestor).
+    """
+    depths = _depths(nodes)
+    allowed = set(ALLOWED_RANKS)
+    candidates = [t for t in nodes if t != 1]
+    rng.shuffle(candidates)
+    candidates.sort(key=lambda t: abs(depths[t] - depth))
+
+    filtered = [t for t in candidates if nodes[t][1] not in allowed]
+    kept = [t for t in candidates if nodes[t][1] in allowed]
+    n_filtered = min(len(filtered), round(taxa * filtered_share))
+    chosen = filtered[:n_filtered] + kept[: taxa - n_filtered]
+    rng.shuffle(chosen)
+    return chosen
+
+
+def write_tsv(
+    taxdump_dir: Path,
+    out_path: Path,
+    lines: int = 100_000,
+    taxa: int = 1_000,
+    depth: int = 9,
+    filtered_share: float = 0.2,
+    evalues: bool = True,
+    fasta_headers: bool = False,
+    seed: int = 1,
+) -> None:
+    rng = random.Random(seed)
+    taxids = pick_taxids(_read_nodes(taxdump_dir), taxa, depth, filtered_share, rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(taxids))]
+
+    header = ["gene", "taxID"] + (["e-value"] if evalues else []) + (["fasta header"] if fasta_headers else [])
+    drawn = rng.choices(taxids, weights=weights, k=lines)
+
+    with open(out_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\t".join(header) + "\n")
+        for i, taxid in enumerate(drawn):
+            row = [f"gene_{i}", "NA" if rng.random() < UNASSIGNED_SHARE else str(taxid)]
+            if evalues:
+                row.append(f"{rng.random() * 10 ** -rng.randint(0, 50):.2e}")
+            if fasta_headers:
+                row.append(f">contig_{i // 20}_{i} partial=00")
+            f.write("\t".join(row) + "\n")
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--lines", type=int, default=100_000, help="data lines (default: %(default)s)")
+    parser.add_argument("--taxa", type=int, default=1_000, help="distinct taxIDs (default: %(default)s)")
+    parser.add_argument("--depth", type=int, default=9, help="target lineage depth of the taxIDs (default: %(default)s)")
+    parser.add_argument("--filtered-share", type=float, default=0.2, help="share of taxIDs with a filtered-out rank (default: %(default)s)")
+    parser.add_argument("--no-evalues", dest="evalues", action="store_false", help="leave out the e-value column")
+    parser.add_argument("--fasta-headers", action="store_true", help="add a FASTA header column")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("taxdump_dir", type=Path)
+    parser.add_argument("out_path", type=Path)
+    add_arguments(parser)
+    args = parser.parse_args()
+    write_tsv(
+        args.taxdump_dir,
+        args.out_path,
+        lines=args.lines,
+        taxa=args.taxa,
+        depth=args.depth,
+        filtered_share=args.filtered_share,
+        evalues=args.evalues,
+        fasta_headers=args.fasta_headers,
+        seed=args.seed,
+    )
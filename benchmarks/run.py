@@ -0,0 +1,181 @@
+"""
+Stage-by-stage benchmark of the /load_tsv_data pipeline, fully offline.
+
+Generates (once) the fake taxdump and a synthetic input in the work directory, compiles the
+taxonomy index outside the measurements, then runs each pipeline stage `--repeat` times and
+prints the timings as JSON (or writes them to --output). With --trace-memory, one extra
+pass records each stage's peak allocation with tracemalloc.
+
+Usage: python -m benchmarks.run [--lines 100000] [--taxa 1000] [--builder trie|legacy] [--output results.json]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+
+from benchmarks.fake_taxdump import DEFAULT_TAXA, write_taxdump
+from benchmarks.generate_tsv import add_arguments, write_tsv
+
+DEFAULT_WORK_DIR = Path(__file__).resolve().parent / ".work"
+
+
+def run_pipeline(tsv_path: Path, builder: str, response_format: str, trace_memory: bool, top_k: int = 0) -> Tuple[Dict[str, float], Dict[str, int], int]:
+    """One pass over the same stages as `build_tsv_dataset` + `render_tsv_dataset`; returns seconds and peak bytes per stage."""
+    from app.core.config import ALLOWED_RANKS
+    from app.utils.hits import materialize_hits, materialize_sorted_hits
+    from app.utils.parsing import build_raw_taxon_index, build_rank_filtered_taxon_set
+    from app.utils.serialization import render_dataset
+    from app.utils.sorting import dedupe_and_sort_lineages, propagate_counts_and_build_children, sort_hits_by_evalue
+    from app.utils.streaming import iter_lines
+    from app.utils.tree import build_taxon_tree
+
+    seconds: Dict[str, float] = {}
+    peak_bytes: Dict[str, int] = {}
+
+    def stage(name: str, fn: Callable[..., Any], *args: Any) -> Any:
+        gc.collect()
+        if trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = fn(*args)
+        seconds[name] = time.perf_counter() - start
+        if trace_memory:
+            peak_bytes[name] = tracemalloc.get_traced_memory()[1] - baseline
+        return result
+
+    with open(tsv_path, "rb") as stream:
+        lines = iter_lines(stream)
+        header_line = next(lines, "")
+        raw_taxa, raw_lns, hits, has_evalues, has_fasta_headers = stage("build_raw_taxon_index", build_raw_taxon_index, header_line, lines)
+
+    if builder == "legacy":
+        tax_set, lns = stage("build_rank_filtered_taxon_set", build_rank_filtered_taxon_set, raw_taxa, raw_lns, has_evalues, has_fasta_headers)
+        lns = stage("dedupe_and_sort_lineages", dedupe_and_sort_lineages, lns)
+        tax_set = stage("propagate_counts_and_build_children", propagate_counts_and_build_children, lns, tax_set)
+    else:
+        tax_set, lns = stage("build_taxon_tree", build_taxon_tree, raw_taxa, raw_lns, has_evalues, has_fasta_headers)
+
+    if builder == "legacy":
+        tax_set = stage("materialize_hits", materialize_hits, tax_set, hits)
+        tax_set = stage("sort_hits_by_evalue", sort_hits_by_evalue, tax_set)
+    else:
+        tax_set = stage("materialize_sorted_hits", materialize_sorted_hits, tax_set, hits, top_k)
+
+    dataset = {"lns": lns, "taxSet": tax_set, "eValueEnabled": has_evalues, "fastaEnabled": has_fasta_headers, "rankPatternFull": ALLOWED_RANKS}
+    body = stage("serialization", render_dataset, dataset, response_format)
+    return seconds, peak_bytes, len(body)
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    add_arguments(parser)
+    parser.add_argument("--taxdump-taxa", type=int, default=DEFAULT_TAXA, help="size of the fake taxonomy (default: %(default)s)")
+    parser.add_argument("--builder", choices=["trie", "legacy"], default="trie", help="tree construction engine to measure")
+    parser.add_argument("--top-k", type=int, default=0, help="best hits kept per taxon, 0 for all (trie builder only)")
+    parser.add_argument("--format", default="json", help="response format to serialize (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--lineage-cache", action="store_true", help="keep the lineage cache warm between repeats")
+    parser.add_argument("--trace-memory", action="store_true", help="add a pass that records peak allocations per stage")
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR)
+    parser.add_argument("--output", type=Path, help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir.resolve()
+    taxdump_dir = work_dir / f"taxonomy-{args.taxdump_taxa}" / "data" / "taxonomy"
+    if not (taxdump_dir / "nodes.dmp").exists():
+        write_taxdump(taxdump_dir, args.taxdump_taxa)
+
+    tsv_path = work_dir / (
+        f"input-l{args.lines}-t{args.taxa}-d{args.depth}-f{args.filtered_share}"
+        f"-e{int(args.evalues)}-h{int(args.fasta_headers)}-s{args.seed}-x{args.taxdump_taxa}.tsv"
+    )
+    if not tsv_path.exists():
+        write_tsv(taxdump_dir, tsv_path, args.lines, args.taxa, args.depth, args.filtered_share, args.evalues, args.fasta_headers, args.seed)
+
+    # The app looks for data/taxonomy relative to the working directory.
+    os.chdir(taxdump_dir.parent.parent)
+    from app.core.taxdb import get_taxdb, lineage_cache
+
+    get_taxdb()  # compile/map the index outside the measurements
+    if not args.lineage_cache:
+        lineage_cache.max_bytes = 0
+
+    runs = [run_pipeline(tsv_path, args.builder, args.format, trace_memory=False, top_k=args.top_k) for _ in range(args.repeat)]
+
+    peak_bytes: Dict[str, int] = {}
+    if args.trace_memory:
+        tracemalloc.start()
+        _, peak_bytes, _ = run_pipeline(tsv_path, args.builder, args.format, trace_memory=True, top_k=args.top_k)
+        tracemalloc.stop()
+
+    stages = {}
+    for name in runs[0][0]:
+        samples = [seconds[name] for seconds, _, _ in runs]
+        stages[name] = {"seconds": samples, "median": statistics.median(samples), "min": min(samples)}
+        if name in peak_bytes:
+            stages[name]["peakBytes"] = peak_bytes[name]
+    totals = [sum(seconds.values()) for seconds, _, _ in runs]
+
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    results = {
+        "benchmark": "load_tsv_data",
+        "params": {
+            "lines": args.lines,
+            "taxa": args.taxa,
+            "depth": args.depth,
+            "filteredShare": args.filtered_share,
+            "evalues": args.evalues,
+            "fastaHeaders": args.fasta_headers,
+            "seed": args.seed,
+            "taxdumpTaxa": args.taxdump_taxa,
+            "builder": args.builder,
+            "topK": args.top_k,
+            "format": args.format,
+            "repeat": args.repeat,
+            "lineageCache": args.lineage_cache,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "commit": _git_commit(),
+        },
+        "stages": stages,
+        "total": {"seconds": totals, "median": statistics.median(totals), "min": min(totals)},
+        "responseBytes": runs[0][2],
+        "maxRssBytes": max_rss,
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Shared fixtures: a small deterministic taxonomy from `benchmarks.fake_taxdump`, compiled once per
+test session, with the app pointed at it (it looks for data/taxonomy relative to the working
+directory, like `benchmarks.run` relies on).
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from benchmarks.fake_taxdump import write_taxdump
+from benchmarks.generate_tsv import write_tsv
+
+FAKE_TAXA = 3_000
+
+
+@pytest.fixture(scope="session")
+def taxdump_dir(tmp_path_factory) -> Path:
+    taxdump_dir = tmp_path_factory.mktemp("taxsun") / "data" / "taxonomy"
+    write_taxdump(taxdump_dir, FAKE_TAXA)
+    return taxdump_dir
+
+
+@pytest.fixture(scope="session")
+def taxdb(taxdump_dir):
+    """The compiled index of the fake taxonomy, as `get_taxdb()` returns it to the app."""
+    cwd = os.getcwd()
+    os.chdir(taxdump_dir.parent.parent)
+    try:
+        from app.core.taxdb import get_taxdb
+
+        yield get_taxdb()
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def tsv_path(taxdump_dir, tmp_path_factory) -> Path:
+    """Synthetic upload over the fake taxonomy, including filtered-out ranks and unassigned lines."""
+    path = tmp_path_factory.mktemp("inputs") / "hits.tsv"
+    write_tsv(taxdump_dir, path, lines=5_000, taxa=400, fasta_headers=True)
+    return path
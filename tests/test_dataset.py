@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.executor import dataset_executor
+from app.main import create_app
+from app.services.fasta_store import fasta_store
+from app.services.result_cache import result_cache
+
+FASTA = ">sp|P1|first protein\nMKV\nLLA*\n>sp|P2|second protein\nMGG\n"
+
+
+@pytest.fixture
+def client(taxdb, tmp_path, monkeypatch):
+    # In-process parsing: spawned workers would not find the fake taxonomy.
+    monkeypatch.setattr(dataset_executor, "workers", 0)
+    monkeypatch.setattr(fasta_store, "root", tmp_path / "fasta")
+    return TestClient(create_app())
+
+
+@pytest.fixture
+def store_id(client):
+    response = client.post("/load_faa_data?sequences=false", files={"file": ("proteins.faa", FASTA.encode())})
+    assert response.status_code == 200
+    return response.json()["faaStoreId"]
+
+
+def test_faa_sequences(client, store_id):
+    response = client.post(f"/faa_data/{store_id}/sequences", json={"headers": ["sp|P2|second protein", "nope"]})
+    assert response.json() == {"sequences": {"sp|P2|second protein": "MGG"}, "missing": ["nope"]}
+
+
+@pytest.mark.parametrize("body", [{"hdrs": []}, ["sp|P2|second protein"], {"headers": "sp|P2|second protein"}])
+def test_faa_sequences_rejects_malformed_body(client, store_id, body):
+    assert client.post(f"/faa_data/{store_id}/sequences", json=body).status_code == 422
+
+
+def test_faa_sequences_rejects_non_json_body(client, store_id):
+    response = client.post(f"/faa_data/{store_id}/sequences", content=b"headers", headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+
+def test_cache_hit_serves_the_same_body(client, tsv_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "root", tmp_path / "results")
+    responses = []
+    for _ in range(2):
+        with open(tsv_path, "rb") as f:
+            responses.append(client.post("/load_tsv_data", files={"file": ("hits.tsv", f)}, headers={"Accept-Encoding": "identity"}))
+
+    assert list((tmp_path / "results").iterdir())
+    miss, hit = responses
+    assert hit.status_code == 200
+    assert hit.content == miss.content
+    assert hit.headers["Content-Length"] == str(len(miss.content))
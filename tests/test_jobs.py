@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.executor import DatasetExecutor, dataset_executor
+from app.main import create_app
+
+
+def test_reserved_slot_is_not_rejected_when_busy():
+    executor = DatasetExecutor(workers=0, queue_depth=0)
+    executor.reserve()
+
+    with pytest.raises(HTTPException) as busy:
+        asyncio.run(executor.run(pow, 2, 3))
+    assert busy.value.status_code == 503
+    assert asyncio.run(executor.run_reserved(pow, 2, 3)) == 8
+
+    executor.release()
+    assert executor.active == 0
+
+
+def test_async_job_holds_its_slot_until_done(taxdb, tsv_path, monkeypatch):
+    monkeypatch.setattr(dataset_executor, "workers", 0)
+    monkeypatch.setattr(dataset_executor, "queue_depth", 0)
+    # The `with` block keeps one event loop alive for the background job.
+    with TestClient(create_app()) as client:
+        with open(tsv_path, "rb") as f:
+            response = client.post("/load_tsv_data?mode=async", files={"file": ("hits.tsv", f)})
+        assert response.status_code == 202
+
+        for _ in range(200):
+            status = client.get(response.json()["statusUrl"]).json()
+            if status["status"] in ("done", "failed"):
+                break
+            time.sleep(0.05)
+        assert status["status"] == "done"
+        assert dataset_executor.active == 0
+        assert client.get(response.json()["resultUrl"]).json()["taxSet"]["root root"]["totCount"] > 0
+
+
+def test_pool_broken_during_warm_up_is_replaced(monkeypatch):
+    executor = DatasetExecutor(workers=1, queue_depth=0)
+
+    class BrokenPool:
+        shut_down = False
+
+        def submit(self, fn, *args):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    broken = BrokenPool()
+    monkeypatch.setattr(executor, "_pool", broken)
+    with pytest.raises(BrokenProcessPool):
+        executor.warm_up()
+    assert executor._pool is None
+    assert broken.shut_down
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.services import lookup_service
+
+
+@pytest.fixture
+def client(taxdb):
+    # Without the `with` block the lifespan (warm-up, refresher) does not run.
+    return TestClient(create_app())
+
+
+def test_fetch_id(client, taxdb):
+    assert client.post("/fetchID", json={"taxName": taxdb.name(2)}).json() == {"taxID": 2}
+
+
+def test_fetch_id_of_unknown_name(client):
+    response = client.post("/fetchID", json={"taxName": "no such taxon"})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Unknown taxon name: no such taxon"}
+
+
+def test_lookups_answer_503_while_the_taxonomy_loads(client, taxdb, monkeypatch):
+    monkeypatch.setattr(lookup_service, "taxonomy_warmup", SimpleNamespace(loading=True))
+    response = client.post("/fetchID", json={"taxName": taxdb.name(2)})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_fetch_ids(client, taxdb):
+    name = taxdb.name(2)
+    response = client.post("/fetchIDs", json={"taxNames": [name.upper(), "nope"], "ignoreCase": True})
+    assert response.json() == {"taxIDs": {name.upper(): [2], "nope": []}}
+    assert client.post("/fetchIDs", json={"names": [name]}).status_code == 422
+
+
+def test_ancestry_routes(client, taxdb):
+    leaf = max(taxdb.preorder.tolist(), key=lambda t: len(taxdb.taxid_lineage(t)))
+    lineage = taxdb.taxid_lineage(leaf)
+    response = client.post("/isAncestor", json={"ancestor": lineage[2], "taxIDs": [leaf, lineage[1], 1, -3]})
+    assert response.json() == {"ancestor": lineage[2], "isAncestor": [True, True, False, False]}
+
+    response = client.post("/subtreeTotals", json={"taxIDs": lineage, "counts": [1] * len(lineage), "ancestors": [1, leaf]})
+    assert response.json() == {"totals": {"1": len(lineage), str(leaf): 1}}
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/isAncestor", {"taxIDs": [2]}),
+        ("/subtreeTotals", {"taxIDs": [2], "ancestors": [1]}),
+        ("/subtreeTotals", {"taxIDs": [2], "counts": [1, 2], "ancestors": [1]}),
+    ],
+)
+def test_ancestry_routes_reject_bad_input(client, path, body):
+    assert client.post(path, json=body).status_code == 422
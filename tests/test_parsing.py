@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from app.core.config import ALLOWED_RANKS
+from app.services.dataset_service import build_tsv_dataset_from_index
+from app.utils.parsing import build_raw_taxon_index, build_raw_taxon_index_sharded, shard_ranges
+from app.utils.serialization import encode_json
+from app.utils.streaming import iter_lines
+from tests.test_tree import build_dataset
+
+
+def merged_pair_below_filtered_rank(taxdb):
+    """(old, new) merged taxIDs whose replacement has a rank that the rank filter drops."""
+    for old, new in taxdb.merged.tolist():
+        if taxdb.rank_of(new) not in ALLOWED_RANKS:
+            return old, new
+    pytest.fail("the fake taxonomy has no merged taxID at a filtered-out rank")
+
+
+@pytest.mark.parametrize("builder", ["trie", "legacy"])
+def test_merged_taxid_pools_with_its_replacement_once(taxdb, tmp_path, monkeypatch, builder):
+    old, new = merged_pair_below_filtered_rank(taxdb)
+    path = tmp_path / "merged.tsv"
+    path.write_text("gene\ttaxID\te-value\n" + "".join(f"g{i}\t{t}\t1e-{i + 1}\n" for i, t in enumerate([new, old, new, old])))
+
+    tax_set = build_dataset(path, builder, monkeypatch)["taxSet"]
+
+    # The filtered leaf's four hits land once on its nearest kept ancestor.
+    kept = next(taxdb.name(t) + " " + taxdb.rank_of(t) for t in taxdb.taxid_lineage(new) if taxdb.rank_of(t) in ALLOWED_RANKS)
+    assert tax_set[kept]["unaCount"] == 4
+    assert tax_set[kept]["totCount"] == 4
+    assert sorted(tax_set[kept]["geneNames"]) == ["g0", "g1", "g2", "g3"]
+    assert tax_set["root root"]["totCount"] == 4
+
+
+def test_shard_ranges_cut_at_line_starts(tsv_path):
+    data = tsv_path.read_bytes()
+    data_start = data.index(b"\n") + 1
+    ranges = shard_ranges(str(tsv_path), data_start, 4, 1)
+
+    assert len(ranges) == 4
+    assert ranges[0][0] == data_start and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[start - 1 : start] == b"\n"
+
+
+def test_sharded_parse_matches_sequential_parse(taxdb, tsv_path):
+    with open(tsv_path, "rb") as f:
+        lines = iter_lines(f)
+        sequential = build_raw_taxon_index(next(lines), lines)
+    sharded = build_raw_taxon_index_sharded(str(tsv_path), 3, min_shard_bytes=1)
+
+    # Same taxa, lineages and hit rows, in the same order.
+    assert sharded[1] == sequential[1]
+    assert sharded[2].taxon_codes.tolist() == sequential[2].taxon_codes.tolist()
+    assert encode_json(build_tsv_dataset_from_index(sharded)) == encode_json(build_tsv_dataset_from_index(sequential))
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from app.services import result_cache as result_cache_module
+from app.services.result_cache import ResultCache
+
+
+def use_version(monkeypatch, version):
+    monkeypatch.setattr(result_cache_module, "get_taxdb", lambda: SimpleNamespace(version=version))
+
+
+def test_versions_are_pruned_only_when_this_process_switches(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path, max_bytes=1 << 20)
+    (tmp_path / "v0").mkdir()
+    (tmp_path / "v2").mkdir()  # e.g. written by a worker that already switched
+
+    use_version(monkeypatch, "v1")
+    cache.put("a", b"body")
+    cache.put("b", b"body")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["v0", "v1", "v2"]
+
+    # Switching keeps the version left behind for workers still serving it.
+    use_version(monkeypatch, "v2")
+    assert cache.get("a") is None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["v1", "v2"]
+
+    cache.put("a", b"new")
+    with cache.get("a") as f:
+        assert f.read() == b"new"
+    assert (tmp_path / "v1" / "b.body").exists()
+
+
+def test_hit_survives_eviction_of_its_entry(tmp_path, monkeypatch):
+    use_version(monkeypatch, "v1")
+    cache = ResultCache(tmp_path, max_bytes=6)
+    cache.put("a", b"body a")
+    hit = cache.get("a")
+
+    # Another worker's put evicts the entry before the hit is sent.
+    cache.put("b", b"body b")
+    assert not (tmp_path / "v1" / "a.body").exists()
+    assert cache.get("a") is None
+    with hit:
+        assert hit.read() == b"body a"
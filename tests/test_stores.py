@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.executor import dataset_executor
+from app.main import create_app
+from app.services.fasta_store import FastaStore
+from app.services.session_store import session_store
+
+STORE_ID = "ab" * 32
+
+
+def test_store_write_open_and_sweep(tmp_path):
+    store = FastaStore(tmp_path, ttl_seconds=60)
+    assert not store.contains(STORE_ID)
+    assert store.write(STORE_ID, [("a", "MKV"), ("b", "MGG"), ("a", "LLA")]) == 2
+    # A second writer of the same content leaves the first store in place.
+    assert store.write(STORE_ID, [("c", "M")]) == 1
+    assert store.read_all(STORE_ID) == {"a": "LLA", "b": "MGG"}
+
+    abandoned = tmp_path / f".{STORE_ID}.1.tmp"
+    abandoned.mkdir()
+    stale = time.time() - 120
+    os.utime(abandoned, (stale, stale))
+    os.utime(tmp_path / STORE_ID, (stale, stale))
+    store.count(STORE_ID)  # opening marks the store as used
+    store.sweep()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [STORE_ID]
+
+
+@pytest.mark.parametrize("store_id, detail", [("not-an-id", "Unknown FASTA store"), ("cd" * 32, "Unknown or expired FASTA store")])
+def test_store_rejects_unknown_ids(tmp_path, store_id, detail):
+    with pytest.raises(HTTPException) as unknown:
+        FastaStore(tmp_path, ttl_seconds=60).fetch(store_id, ["a"])
+    assert unknown.value.status_code == 404
+    assert unknown.value.detail.startswith(detail)
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path):
+    def records():
+        yield "a", "MKV"
+        raise ValueError("truncated upload")
+
+    store = FastaStore(tmp_path, ttl_seconds=60)
+    with pytest.raises(ValueError):
+        store.write(STORE_ID, records())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_session_round_trip(taxdb, tsv_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_executor, "workers", 0)
+    monkeypatch.setattr(session_store, "root", tmp_path / "sessions")
+    client = TestClient(create_app())
+    with open(tsv_path, "rb") as f:
+        overview = client.post("/load_tsv_data?mode=session", files={"file": ("hits.tsv", f)}).json()
+
+    dataset_id = overview["datasetId"]
+    assert session_store.contains(dataset_id)
+    child = overview["children"][0]
+    page = client.get(f"/datasets/{dataset_id}/hits", params={"taxon": child["key"], "limit": 5}).json()
+    assert page["total"] == child["hitCount"]
+    assert len(page["names"]) == min(5, child["hitCount"])
+    assert client.get(f"/datasets/{'ef' * 32}/children").status_code == 404
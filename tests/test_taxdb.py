@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import threading
+
+from fastapi.testclient import TestClient
+
+import app.main as main_module
+from app.core import taxdb as taxdb_module
+from app.core.taxdb import TaxonomyWarmup
+
+
+def test_failed_warm_up_is_retried(taxdb, monkeypatch):
+    attempts = []
+
+    def flaky_get_taxdb():
+        attempts.append(None)
+        if len(attempts) < 3:
+            raise OSError("taxdump mirror unreachable")
+        return taxdb
+
+    monkeypatch.setattr(taxdb_module, "get_taxdb", flaky_get_taxdb)
+    warmup = TaxonomyWarmup(True)
+    warmup.retry_seconds = 0.01
+    done = threading.Event()
+    warmup.start(then=done.set)
+
+    assert done.wait(5)
+    assert len(attempts) == 3
+    assert warmup.error is None
+
+
+def test_ready_starts_the_load_when_warm_up_is_disabled(monkeypatch):
+    warmup = TaxonomyWarmup(False)
+    warmup.start()
+    assert warmup._thread is None
+
+    started = []
+    monkeypatch.setattr(warmup, "_spawn", lambda: started.append(None))
+    monkeypatch.setattr(main_module, "taxonomy_warmup", warmup)
+    monkeypatch.setattr(main_module, "taxonomy_ready", lambda: False)
+    monkeypatch.setattr(taxdb_module, "taxonomy_ready", lambda: False)
+
+    assert TestClient(main_module.create_app()).get("/ready").status_code == 503
+    assert started == [None]
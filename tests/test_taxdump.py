@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import hashlib
+import tarfile
+
+import pytest
+
+from app.core import taxdb as taxdb_module
+from app.core.taxindex import TaxdumpTables, build_taxonomy_index
+
+DUMP_FILES = ("nodes.dmp", "names.dmp", "merged.dmp")
+
+
+@pytest.fixture(scope="module")
+def archive(taxdump_dir, tmp_path_factory):
+    """A taxdump.tar.gz with the dumps in a subdirectory, between members the index does not use."""
+    mirror = tmp_path_factory.mktemp("mirror")
+    extra = mirror / "readme.txt"
+    extra.write_text("fake taxdump\n")
+    path = mirror / "taxdump.tar.gz"
+    with tarfile.open(path, "w:gz") as tar:
+        tar.add(extra, arcname="readme.txt")
+        for name in DUMP_FILES:
+            tar.add(taxdump_dir / name, arcname=f"taxdump/{name}")
+        tar.add(extra, arcname="gc.prt")
+    return path
+
+
+def stream(source, target_dir, monkeypatch, tables=None):
+    monkeypatch.setattr(taxdb_module, "TAXDUMP_SOURCE", str(source))
+    return taxdb_module._stream_taxdump(target_dir, tables)
+
+
+@pytest.mark.parametrize("use_mirror_dir", [False, True])
+def test_streamed_extraction_matches_two_step_extraction(archive, tmp_path, monkeypatch, use_mirror_dir):
+    reference = tmp_path / "reference"
+    with tarfile.open(archive, "r:gz") as tar:
+        tar.extractall(reference, filter="data")
+
+    streamed = tmp_path / "streamed"
+    md5 = stream(archive.parent if use_mirror_dir else archive, streamed, monkeypatch)
+
+    assert md5 == hashlib.md5(archive.read_bytes()).hexdigest()
+    assert sorted(p.name for p in streamed.iterdir()) == sorted(DUMP_FILES)
+    for name in DUMP_FILES:
+        assert (streamed / name).read_bytes() == (reference / "taxdump" / name).read_bytes()
+
+
+def test_index_from_streamed_tables_matches_index_from_files(archive, tmp_path, monkeypatch):
+    tables = TaxdumpTables()
+    stream(archive, tmp_path, monkeypatch, tables)
+    dumps = [tmp_path / name for name in DUMP_FILES]
+
+    build_taxonomy_index(*dumps, tmp_path / "from_tables", tables)
+    build_taxonomy_index(*dumps, tmp_path / "from_files")
+
+    files = sorted(p.name for p in (tmp_path / "from_files").iterdir())
+    assert sorted(p.name for p in (tmp_path / "from_tables").iterdir()) == files
+    for name in files:
+        assert (tmp_path / "from_tables" / name).read_bytes() == (tmp_path / "from_files" / name).read_bytes()
+
+
+def test_archive_without_the_dumps_is_rejected(tmp_path, monkeypatch):
+    empty = tmp_path / "taxdump.tar.gz"
+    with tarfile.open(empty, "w:gz"):
+        pass
+    with pytest.raises(RuntimeError, match="lacks"):
+        stream(empty, tmp_path / "out", monkeypatch)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import pytest
+
+from app.core.taxdb import resolve_lineages
+
+
+@pytest.fixture(scope="module")
+def taxopy():
+    return pytest.importorskip("taxopy")
+
+
+@pytest.fixture(scope="module")
+def reference(taxopy, taxdump_dir):
+    return taxopy.TaxDb(
+        nodes_dmp=str(taxdump_dir / "nodes.dmp"),
+        names_dmp=str(taxdump_dir / "names.dmp"),
+        merged_dmp=str(taxdump_dir / "merged.dmp"),
+        keep_files=True,
+    )
+
+
+def _all_taxids(taxdb):
+    return [t for t in range(len(taxdb.parent)) if t in taxdb]
+
+
+def test_index_matches_taxopy(taxdb, taxopy, reference):
+    # Every taxID, merged ones included, resolves like taxopy's Taxon did before the index.
+    for taxid in _all_taxids(taxdb):
+        taxon = taxopy.Taxon(taxid, reference)
+        assert taxdb.name(taxid) == taxon.name
+        assert taxdb.rank_of(taxid) == taxon.rank
+        assert list(taxdb.rank_name_lineage(taxid).items()) == list(taxon.rank_name_dictionary.items())
+
+
+def test_batch_resolution_matches_single_lookups(taxdb):
+    taxids = _all_taxids(taxdb)
+    resolved = resolve_lineages(taxids)
+    for taxid, (name, rank, lineage) in zip(taxids, resolved):
+        assert (name, rank) == (taxdb.name(taxid), taxdb.rank_of(taxid))
+        assert list(lineage.items()) == list(taxdb.rank_name_lineage(taxid).items())
+
+
+def test_unknown_taxid_is_rejected(taxdb):
+    with pytest.raises(ValueError):
+        taxdb.name(len(taxdb.parent) + 10)
+
+
+def _canonical(taxdb):
+    # A merged taxID stands for its replacement in the interval index.
+    merged = dict(taxdb.merged.tolist())
+    return lambda taxid: merged.get(taxid, taxid)
+
+
+@pytest.fixture(scope="module")
+def ancestors_of(taxdb):
+    """taxID -> the (canonical) taxIDs of its lineage, from walking parent links."""
+    canonical = _canonical(taxdb)
+    return {t: {canonical(a) for a in taxdb.taxid_lineage(canonical(t))} for t in _all_taxids(taxdb)}
+
+
+def test_intervals_agree_with_lineages(taxdb, ancestors_of):
+    canonical = _canonical(taxdb)
+    taxids = list(ancestors_of)
+
+    for ancestor in taxids[::37]:
+        expected = [canonical(ancestor) in ancestors_of[t] for t in taxids]
+        assert [taxdb.is_ancestor(ancestor, t) for t in taxids] == expected
+        assert taxdb.in_subtree(ancestor, taxids).tolist() == expected
+
+        subtree = taxdb.subtree(ancestor).tolist()
+        assert subtree[0] == canonical(ancestor)
+        assert set(subtree) == {t for t, hit in zip(taxids, expected) if hit and canonical(t) == t}
+
+
+def test_preorder_covers_every_live_taxid_once(taxdb):
+    live = [t for t in _all_taxids(taxdb) if t not in dict(taxdb.merged.tolist())]
+    assert sorted(taxdb.preorder.tolist()) == live
+    assert taxdb.subtree(1).tolist() == taxdb.preorder.tolist()
+
+
+def test_subtree_totals_match_lineage_sums(taxdb, ancestors_of):
+    canonical = _canonical(taxdb)
+    taxids = list(ancestors_of)[::3]
+    counts = [(t * 7) % 11 for t in taxids]
+    ancestors = list(ancestors_of)[::5]
+
+    totals = taxdb.subtree_totals(taxids, counts, ancestors).tolist()
+    for ancestor, total in zip(ancestors, totals):
+        assert total == sum(c for c, t in zip(counts, taxids) if canonical(ancestor) in ancestors_of[t])
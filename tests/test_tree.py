@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services import dataset_service
+from app.utils.serialization import encode_json
+
+
+def build_dataset(path, builder, monkeypatch, top_k=0):
+    monkeypatch.setattr(dataset_service, "TREE_BUILDER", builder)
+    with open(path, "rb") as stream:
+        return dataset_service.build_tsv_dataset(stream, top_k=top_k)
+
+
+@pytest.mark.parametrize("top_k", [0, 3])
+def test_trie_builder_matches_legacy_builder(taxdb, tsv_path, monkeypatch, top_k):
+    legacy = build_dataset(tsv_path, "legacy", monkeypatch, top_k)
+    trie = build_dataset(tsv_path, "trie", monkeypatch, top_k)
+    assert encode_json(trie) == encode_json(legacy)
+
+
+def test_counts_add_up(taxdb, tsv_path, monkeypatch):
+    dataset = build_dataset(tsv_path, "trie", monkeypatch)
+    tax_set = dataset["taxSet"]
+    lines = sum(1 for _ in open(tsv_path)) - 1
+    assert tax_set["root root"]["totCount"] == lines
+    assert sum(obj["unaCount"] for obj in tax_set.values()) == lines
+    assert sum(len(obj["names"]) for key, obj in tax_set.items() if key != "root root") + tax_set["root root"]["unaCount"] == lines